@@ -1,450 +1,3031 @@
-# Célula 1 (Integrada): Instalação das bibliotecas necessárias
-print("Instalando bibliotecas necessárias (CrewAI, LiteLLM, Langchain Community, Flask, Twilio, PyNgrok)...")
-!pip install -q crewai crewai-tools langchain-community Flask twilio pyngrok python-dotenv
-
-print("Bibliotecas instaladas.")
-
-# Célula 2 (Integrada): Configuração da API Keys e Inicialização da LLM
-import os
-import threading
-import time
-from flask import Flask, request
-from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client # Importar o cliente Twilio
-from google.colab import userdata
-from crewai import Agent, Task, Crew, Process
-from langchain_community.chat_models import ChatLiteLLM
-from pyngrok import ngrok
-from werkzeug.serving import run_simple
-
-# --- Configuração das API Keys do Google Gemini ---
-print("\nConfigurando API Key do Google Gemini...")
-try:
-    google_api_key_value = userdata.get('GOOGLE_API_KEY')
-    if not google_api_key_value:
-        raise ValueError("GOOGLE_API_KEY não encontrada nos Secrets do Colab.")
-    os.environ["GOOGLE_API_KEY"] = google_api_key_value
-    print("✅ API Key do Google Gemini carregada com sucesso do Colab Secrets.")
-except Exception as e:
-    print(f"❌ ERRO FATAL: Falha ao carregar API Key do Google Gemini: {e}")
-    print("Por favor, verifique sua 'GOOGLE_API_KEY' nos Colab Secrets.")
-    exit()
-
-# --- Configuração das API Keys da Twilio ---
-print("\nConfigurando API Keys da Twilio...")
-try:
-    twilio_account_sid_value = userdata.get('TWILIO_ACCOUNT_SID')
-    twilio_auth_token_value = userdata.get('TWILIO_AUTH_TOKEN')
-    twilio_phone_number_value = userdata.get('TWILIO_PHONE_NUMBER') # NOVO: seu número da Twilio
-
-    if not all([twilio_account_sid_value, twilio_auth_token_value, twilio_phone_number_value]):
-        raise ValueError("Uma ou mais credenciais da Twilio não encontradas nos Secrets do Colab.")
-
-    os.environ["TWILIO_ACCOUNT_SID"] = twilio_account_sid_value
-    os.environ["TWILIO_AUTH_TOKEN"] = twilio_auth_token_value
-    os.environ["TWILIO_PHONE_NUMBER"] = twilio_phone_number_value
-    print("✅ API Keys e número de telefone da Twilio carregados com sucesso do Colab Secrets.")
-
-except Exception as e:
-    print(f"❌ ERRO FATAL: Falha ao carregar API Keys da Twilio: {e}")
-    print("Por favor, adicione 'TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN' e 'TWILIO_PHONE_NUMBER' nos Colab Secrets.")
-    exit()
-
-# Inicializa o modelo Gemini LLM usando ChatLiteLLM
-gemini_llm = ChatLiteLLM(
-    model="gemini/gemini-2.0-flash",
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    temperature=0.7,
-)
-
-# Inicializa o cliente Twilio
-twilio_client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"])
-
-
-print("✅ Modelo Gemini LLM e Cliente Twilio configurados com sucesso.")
-
-
-# --- DEFINIÇÃO DOS AGENTES PARA O FLUXO DE ASSISTÊNCIA AO PROJETO DO USUÁRIO ---
-pesquisador_mercado = Agent(
-    role='Especialista em Pesquisa e Tendências de Mercado',
-    goal='Investigar tendências, tecnologias e soluções existentes relevantes para a demanda de projeto do usuário, fornecendo insights para o debate.',
-    backstory='Você é um pesquisador incansável, sempre em busca de informações atualizadas para embasar decisões de projeto e identificar oportunidades.',
-    llm=gemini_llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-estrategista_tecnico = Agent(
-    role='Estrategista de Soluções e Facilitador de Debate',
-    goal='Liderar o debate para conceituar a melhor abordagem técnica e funcional para o projeto do usuário, considerando viabilidade, inovação e escalabilidade.',
-    backstory='Com vasta experiência em arquitetura de sistemas e metodologias ágeis, você facilita a discussão e direciona a equipe para soluções eficazes e criativas.',
-    llm=gemini_llm,
-    verbose=True,
-    allow_delegation=True
-)
-
-consolidor_de_prompt = Agent(
-    role='Engenheiro de Prompt e Consolidador de Requisitos',
-    goal='Transformar todas as discussões, pesquisas e debates em um prompt técnico claro, conciso e completo, pronto para ser validado pela equipe externa.',
-    backstory='Você é um mestre na arte de resumir e estruturar informações complexas em documentos técnicos de alta qualidade e prompts acionáveis, garantindo que nada essencial seja perdido.',
-    llm=gemini_llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-validador_de_prompt_externo = Agent(
-    role='Analista de Validação Externa e Qualidade de Prompt',
-    goal='Validar a qualidade, clareza e completude do prompt técnico gerado, garantindo que ele atenda à demanda original do usuário e esteja pronto para a equipe de execução.',
-    backstory='Seu foco é a qualidade e a experiência do usuário final. Você garante que o prompt seja compreensível, útil e alinhado com as expectativas do cliente para quem vai executá-lo, identificando falhas e sugerindo aprimoramentos.',
-    llm=gemini_llm,
-    verbose=True,
-    allow_delegation=False
-)
-
-print("\nAgentes para Assistência de Projetos (fluxo do usuário) definidos.")
-
-
-# --- DEFINIÇÃO DAS TAREFAS PARA O FLUXO DE ASSISTÊNCIA AO PROJETO DO USUÁRIO ---
-pesquisar_demanda_task = Task(
-    description="{demanda_usuario} - Pesquisar e coletar informações relevantes sobre a demanda do usuário. Identifique os requisitos funcionais e não-funcionais, tecnologias mencionadas e desafios potenciais. Prepare um resumo para o debate.",
-    expected_output="Um resumo detalhado da demanda do usuário, incluindo pontos chave, tecnologias, escopo inicial e quaisquer incertezas a serem discutidas.",
-    agent=pesquisador_mercado
-)
-
-debater_e_conceituar_task = Task(
-    description="Com base na pesquisa da demanda e em conhecimentos técnicos, debata as melhores abordagens e soluções técnicas para o projeto do usuário. O objetivo é conceituar a estrutura do projeto, tecnologias principais e um plano de alto nível, considerando viabilidade, inovação e escalabilidade.",
-    expected_output="Um rascunho de plano de projeto de alto nível, com a estrutura da solução, tecnologias principais debatidas e possíveis alternativas.",
-    agent=estrategista_tecnico
-)
-
-consolidar_em_prompt_task = Task(
-    description="Consolidar os resultados da pesquisa e do debate em um *prompt técnico detalhado*. Este prompt deve ser um guia claro e acionável para a equipe de execução, incluindo: visão geral do projeto, requisitos funcionais, requisitos técnicos, tecnologias sugeridas, e a estrutura de módulos/componentes.",
-    expected_output="Um prompt técnico completo e bem estruturado, pronto para ser validado, contendo todos os detalhes essenciais para iniciar o desenvolvimento (formato Markdown).",
-    agent=consolidor_de_prompt
-)
-
-validar_e_apresentar_prompt_task = Task(
-    description="Revise o prompt técnico final gerado a partir da demanda '{demanda_usuario}'. Valide sua clareza, completude, alinhamento com a demanda original do usuário, e se ele está pronto para ser entregue à equipe de execução. Formate a saída para uma apresentação amigável e concisa ao usuário do WhatsApp, incluindo um resumo do plano e indicando que ele foi validado, além de mencionar os próximos passos (que a equipe de execução vai trabalhar nisso). Se houver correções, inclua-as de forma clara. Mantenha a resposta concisa para WhatsApp.",
-    expected_output="O prompt técnico final validado ou um relatório conciso com sugestões de correção. O output deve ser direto para o usuário do WhatsApp, com um resumo do plano e os próximos passos claros.",
-    agent=validador_de_prompt_externo
-)
-
-print("\nTarefas para Assistência de Projetos (fluxo do usuário) definidas.")
-
-
-app = Flask(__name__)
-
-# --- FUNÇÃO ASSÍNCRONA PARA PROCESSAR CREWAI E ENVIAR RESULTADO FINAL ---
-def send_crew_result_async(user_message: str, sender_number: str):
-    """
-    Executa o processo CrewAI em background e envia a mensagem final para o usuário.
-    """
-    print(f"DEBUG: Início do processamento CrewAI assíncrono para '{user_message}'")
-    try:
-        crew_brainstorming_e_validacao = Crew(
-            agents=[
-                pesquisador_mercado,
-                estrategista_tecnico,
-                consolidor_de_prompt,
-                validador_de_prompt_externo
-            ],
-            tasks=[
-                pesquisar_demanda_task,
-                debater_e_conceituar_task,
-                consolidar_em_prompt_task,
-                validar_e_apresentar_prompt_task
-            ],
-            process=Process.sequential,
-            manager_llm=gemini_llm,
-            llm=gemini_llm,
-            verbose=True
-        )
-
-        resultado_do_prompt_tecnico = crew_brainstorming_e_validacao.kickoff(inputs={
-            'demanda_usuario': user_message
-        })
-        final_message = resultado_do_prompt_tecnico
-        print(f"DEBUG: Resultado final do prompt técnico gerado para o usuário: \n{final_message}")
-
-    except Exception as crew_error:
-        print(f"❌ Erro ao executar a Crew de Brainstorming assíncrona: {crew_error}")
-        final_message = "Desculpe, nossa equipe de IA teve um problema ao gerar o plano do seu projeto. Por favor, tente novamente com uma descrição um pouco diferente, ou entre em contato com o suporte."
-
-    # Envia a mensagem final para o usuário usando o cliente Twilio
-    try:
-        twilio_client.messages.create(
-            from_=os.environ["TWILIO_PHONE_NUMBER"], # Seu número Twilio habilitado para WhatsApp
-            to=sender_number,
-            body=final_message
-        )
-        print(f"DEBUG: Mensagem final do CrewAI enviada para {sender_number}.")
-    except Exception as e:
-        print(f"❌ ERRO ao enviar mensagem final do CrewAI para {sender_number}: {e}")
-
-# --- FUNÇÃO SÍNCRONA PARA RESPOSTAS IMEDIATAS (NÃO CREWAI) ---
-def get_immediate_response(user_message: str) -> str:
-    """
-    Retorna a resposta imediata para mensagens que não exigem o processo CrewAI.
-    """
-    user_message_lower = user_message.lower().strip()
-    message_word_count = len(user_message.split())
-
-    # --- NÍVEL 1: SAUDAÇÕES MUITO CURTAS OU COMANDOS INICIAIS EXATOS ---
-    greetings = ["ola", "olá", "oi", "bom dia", "boa tarde", "boa noite", "hi"]
-    start_commands_exact = ["começar", "iniciar projeto", "novo projeto", "criar projeto"]
-    help_commands_exact = ["ajuda", "suporte", "dúvida", "duvida"]
-
-    if message_word_count <= 3 and any(cmd == user_message_lower for cmd in greetings + start_commands_exact + help_commands_exact):
-        if any(cmd == user_message_lower for cmd in help_commands_exact):
-            return (
-                "Claro! Sou seu Assistente de Projetos com IA. Por favor, me diga em que posso te ajudar com mais detalhes. "
-                "Seja para planejar um novo projeto, tirar uma dúvida sobre algo que já geramos, ou para resolver um problema técnico."
-            )
-        else:
-            return (
-                "Olá! Sou seu **Assistente de Projetos com IA**. Nossa equipe de especialistas está pronta para te ajudar a conceituar e planejar seu projeto.\n\n"
-                "**Como posso te ajudar hoje?** Por favor, me diga qual a sua ideia de projeto, o problema que você quer resolver, ou se precisa de suporte com algo específico."
-            )
-
-    # --- NÍVEL 2: DISTINGUIR ENTRE SUPORTE ESPECÍFICO OU PEDIDO DE MAIS DETALHES ---
-    support_keywords = ["erro", "bug", "funciona", "problema no código", "executar", "link", "tutorial", "documentação", "corrigir", "implementar", "instalar"]
-    
-    if message_word_count < 15 and any(kw in user_message_lower for kw in support_keywords):
-        print("DEBUG: Mensagem parece ser uma pergunta de suporte específica. Encaminhando para o LLM direto para resposta de suporte.")
-        suporte_response = gemini_llm.invoke(f"Como Assistente de Projetos com IA, o usuário perguntou: '{user_message}'. Responda de forma concisa e útil, oferecendo ajuda na execução, correção ou fornecendo recursos (links, documentação, tutoriais), se aplicável. O usuário está interagindo via WhatsApp, então a resposta deve ser direta e em português. Lembre-se que você é um consultor de execução de projetos.")
-        return suporte_response.content if hasattr(suporte_response, 'content') else str(suporte_response)
-    
-    # Se nenhuma das condições acima for atendida, é uma ideia de projeto curta/ambígua que precisa de mais detalhes
-    print("DEBUG: Mensagem parece ser uma ideia de projeto curta ou ambígua. Solicitando mais detalhes.")
-    return (
-        "Entendi sua ideia! Para que nossa equipe de especialistas possa criar um plano robusto, preciso de mais detalhes.\n\n"
-        "**Vamos lá detalhar o problema/ideia:** Por favor, me conte mais sobre:\n"
-        "**1. Qual o problema principal que seu projeto resolve ou a ideia central?**\n"
-        "**2. Quais os objetivos? O que ele deve fazer ou entregar?**\n"
-        "**3. Já pensou em alguma tecnologia (ex: Python, React, mobile)?**\n"
-        "**4. Há alguma restrição importante (prazo, orçamento, privacidade)?**\n\n"
-        "Quanto mais detalhes, melhor! Assim podemos criar um prompt técnico mais acertivo."
-    )
-
-
-@app.route("/whatsapp", methods=['POST'])
-def whatsapp_reply():
-    incoming_msg = request.values.get('Body', '').strip()
-    sender_number = request.values.get('From', '').strip()
-
-    print(f"Mensagem recebida de {sender_number}: {incoming_msg}")
-
-    resp = MessagingResponse()
-    
-    message_word_count = len(incoming_msg.split())
-
-    # Decide se a mensagem é um projeto detalhado que exige CrewAI (processo longo)
-    # ou uma mensagem que pode ser respondida imediatamente.
-    if message_word_count >= 15: # O limite de 15 palavras pode ser ajustado
-        # Envia a mensagem de "Aguarde" imediatamente
-        resp.message("Aguarde um instante, por favor! Nossos especialistas de IA estão analisando sua demanda e debatendo a melhor abordagem. Isso pode levar alguns minutos. Assim que tivermos uma resposta ou o plano inicial, te avisaremos! 😊")
-        
-        # Inicia uma nova thread para processar a tarefa longa e enviar a mensagem final
-        thread = threading.Thread(target=send_crew_result_async, args=(incoming_msg, sender_number))
-        thread.daemon = True # Permite que o programa principal saia mesmo se a thread ainda estiver rodando
-        thread.start()
-    else:
-        # Para mensagens curtas/simples, obtém a resposta imediatamente e a envia
-        immediate_response = get_immediate_response(incoming_msg)
-        resp.message(immediate_response)
-
-    return str(resp)
-
-# Função para rodar o servidor Flask em uma thread
-def run_flask_app_thread():
-    run_simple('0.0.0.0', 5000, app, use_reloader=False, use_debugger=False)
-
-# Função para iniciar ngrok e obter a URL pública
-def start_ngrok_tunnel(port):
-    print("Iniciando túnel Ngrok...")
-    try:
-        tunnel = ngrok.connect(port)
-        public_url = tunnel.public_url
-        print(f"🚀 Ngrok Tunnel URL: {public_url}")
-        return public_url
-    except Exception as e:
-        print(f"❌ Erro ao iniciar Ngrok: {e}")
-        print("Certifique-se de ter autenticado o Ngrok. Execute '!ngrok config add-authtoken SEU_TOKEN_NGROK' em uma célula separada.")
-        return None
-
-if __name__ == "__main__":
-    # --- PROMPT E AGENTES QUE "CONSTROEM" O PRÓPRIO BOT DE ASSISTÊNCIA DE PROJETOS (RODA APENAS UMA VEZ) ---
-    engenheiro_requisitos = Agent(
-        role='Engenheiro de Requisitos de Software',
-        goal='Traduzir requisitos do projeto do bot em funcionalidades e especificações claras.',
-        backstory='Você é um engenheiro de requisitos experiente em transformar conceitos de bots de IA em especificações técnicas detalhadas.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-
-    arquiteto_software = Agent(
-        role='Arquiteto de Software e IA',
-        goal='Definir a arquitetura técnica do bot, suas interações com LLMs e APIs.',
-        backstory='Com anos de experiência em engenharia de software e IA, você estrutura soluções escaláveis e eficientes para bots conversacionais.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-
-    dev_backend = Agent(
-        role='Desenvolvedor Python Back-End do Bot',
-        goal='Desenvolver a lógica de comunicação, orquestração de Crews e integração com APIs da Twilio e Google Gemini.',
-        backstory='Você é um desenvolvedor Python focado na criação de APIs robustas e lógica de negócio para bots de IA.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-
-    dev_frontend = Agent(
-        role='Desenvolvedor Front-End de Interface de Teste',
-        goal='Criar interfaces de teste e mensagens iniciais amigáveis para o bot.',
-        backstory='Especialista em experiências digitais, você transforma funcionalidades em interfaces bonitas e intuitivas, e mensagens claras para o usuário.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-
-    qa_validador = Agent(
-        role='Validador QA do Bot',
-        goal='Validar se o bot atende aos requisitos de funcionalidade, privacidade e usabilidade.',
-        backstory='Você é um analista de qualidade com olhar atento para erros e inconsistências em bots de IA.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-    
-    suporte_usuario = Agent(
-        role='Documentador e Suporte de Conhecimento do Bot',
-        goal='Documentar as funcionalidades do bot e preparar guias de uso/solução de problemas internos.',
-        backstory='Você é essencial para garantir que o conhecimento sobre o bot esteja acessível e que ele possa ser mantido e aprimorado.',
-        llm=gemini_llm,
-        verbose=False,
-        allow_delegation=False
-    )
-
-    # Tarefas genéricas para desenvolvimento de software (agora descrevendo o bot em si)
-    analisar_requisitos_task = Task(
-        description='Analisar o prompt que define o "Assistente de Projetos com IA para WhatsApp" e extrair seus requisitos, funcionalidades e fluxo de interação.',
-        expected_output='Lista detalhada de requisitos e funcionalidades para o "Assistente de Projetos com IA para WhatsApp".',
-        agent=engenheiro_requisitos
-    )
-
-    desenhar_arquitetura_task = Task(
-        description='Propor a arquitetura do "Assistente de Projetos com IA para WhatsApp", incluindo tecnologias, camadas da aplicação e como a CrewAI se integrará com Twilio e Gemini.',
-        expected_output='Documento de arquitetura detalhado para o "Assistente de Projetos com IA para WhatsApp".',
-        agent=arquiteto_software
-    )
-
-    implementar_backend_task = Task(
-        description='Desenvolver o back-end do "Assistente de Projetos com IA para WhatsApp" conforme os requisitos e arquitetura definidos, focando na orquestração da CrewAI e na API do WhatsApp.',
-        expected_output='Código-fonte completo do back-end para o "Assistente de Projetos com IA para WhatsApp".',
-        agent=dev_backend
-    )
-
-    implementar_frontend_task = Task(
-        description='Criar as mensagens de boas-vindas e orientação para o "Assistente de Projetos com IA para WhatsApp" e definir uma interface de teste conceitual se aplicável.',
-        expected_output='Textos das mensagens de interação do bot e plano conceitual para interface de teste.',
-        agent=dev_frontend
-    )
-
-    validar_aplicacao_task = Task(
-        description='Testar o "Assistente de Projetos com IA para WhatsApp" para garantir que suas funcionalidades (brainstorming, validação, suporte) operem conforme o esperado e que a privacidade seja mantida.',
-        expected_output='Relatório de validação detalhado para o "Assistente de Projetos com IA para WhatsApp".',
-        agent=qa_validador
-    )
-
-    canal_duvidas_usuario_task_bot = Task(
-        description='Compilar FAQ e documentação interna para o uso e manutenção do "Assistente de Projetos com IA para WhatsApp".',
-        expected_output='Documentação interna e FAQ para o "Assistente de Projetos com IA para WhatsApp".',
-        agent=suporte_usuario
-    )
-
-    prompt_aprovado_bot = """
-    O projeto a ser desenvolvido é um **"Assistente de Projetos com IA para Profissionais no WhatsApp"**. Este bot tem como objetivo principal ajudar profissionais a conceituar e planejar seus projetos de software ou IA, passando por um processo colaborativo e validado.
-
-    **Fluxo de Interação do Bot com o Usuário (Capacidades Principais):**
-    1.  **Brainstorming & Planejamento:** O bot recebe a descrição do projeto do usuário. Uma equipe interna de IA (CrewAI) composta por um *Pesquisador*, *Estrategista* e *Consolidor* debate e gera um "Prompt Técnico Validado" detalhado para o projeto do usuário.
-    2.  **Validação Externa:** O "Prompt Técnico Validado" é então analisado por um *Validador Externo* que garante sua clareza, completude e alinhamento com a demanda original do usuário, antes de ser apresentado.
-    3.  **Simulação de Execução:** O bot informa ao usuário que o "Prompt Técnico Validado" seria então entregue a uma "Equipe de Execução" (conceitual neste MVP) que desenvolveria back-end, front-end e faria a validação.
-    4.  **Canal Aberto para Dúvidas e Suporte:** Após a entrega do prompt, o bot oferece suporte contínuo através de um agente especializado para tirar dúvidas, ajudar na execução local (se o código for gerado), corrigir erros e fornecer recursos (links, docs).
-
-    **Requisitos Chave do Bot (como sistema):**
-    1.  **Interface WhatsApp:** Receber e enviar mensagens via Twilio.
-    2.  **Orquestração de IA:** Utilizar CrewAI para gerenciar a colaboração entre agentes para planejamento de projetos.
-    3.  **Geração de Prompt Técnico:** A saída principal do bot deve ser um prompt técnico detalhado e validado para o projeto do usuário.
-    4.  **Suporte Interativo:** Capacidade de responder a perguntas de acompanhamento sobre o plano ou execução.
-    5.  **Privacidade Total:** Nenhuma mensagem ou dado do usuário será armazenado em disco. O processamento é em memória.
-
-    **Tecnologias Esperadas para o Bot:** Python (Flask), Google Gemini API (via LiteLLM), CrewAI, Twilio WhatsApp API.
-    """
-
-    def create_execution_crew_for_bot_itself(prompt_aprovado: str):
-        crew = Crew(
-            agents=[
-                engenheiro_requisitos,
-                arquiteto_software,
-                dev_backend,
-                dev_frontend,
-                qa_validador,
-                suporte_usuario
-            ],
-            tasks=[
-                analisar_requisitos_task,
-                desenhar_arquitetura_task,
-                implementar_backend_task,
-                implementar_frontend_task,
-                validar_aplicacao_task,
-                canal_duvidas_usuario_task_bot
-            ],
-            process=Process.sequential,
-            verbose=False,
-            manager_llm=gemini_llm,
-            llm=gemini_llm
-        )
-        print("\n--- Iniciando equipe de execução para 'construir' o próprio Bot Assistente de Projetos (processo inicial) ---")
-        return crew.kickoff(inputs={"prompt_aprovado": prompt_aprovado})
-
-    resultado_execucao_bot_proprio = create_execution_crew_for_bot_itself(prompt_aprovado=prompt_aprovado_bot)
-    print("\n✅ Relatório de desenvolvimento do Bot Assistente de Projetos (gerado na inicialização):\n")
-
-    flask_thread = threading.Thread(target=run_flask_app_thread)
-    flask_thread.daemon = True
-    flask_thread.start()
-
-    time.sleep(3)
-
-    ngrok_url = None
-
-    try:
-        ngrok_url = start_ngrok_tunnel(5000)
-
-        if ngrok_url:
-            print(f"\n✨ Bot de Assistente de Projetos WhatsApp pronto em: {ngrok_url}/whatsapp")
-            print("➡️ Configure este URL no seu Twilio WhatsApp Sandbox (Webhook 'WHEN A MESSAGE COMES IN').")
-            print("\n**Mensagem de Boas-Vindas e Orientações do Bot para o WhatsApp:**")
-            print("Olá! Sou seu Assistente de Projetos com IA. Nossa equipe de especialistas está pronta para ajudar a desenvolver o plano para seu projeto.")
-            print("Para começarmos, por favor, descreva em detalhes seu projeto ou problema. Inclua:")
-            print("1. A ideia principal / o que você quer criar.")
-            print("2. Os objetivos e o que o projeto deve fazer.")
-            print("3. Se há alguma tecnologia ou plataforma específica em mente.")
-            print("4. Quaisquer restrições ou requisitos importantes (ex: prazo, orçamento, privacidade).")
-            print("\nQuando estiver pronto, envie 'iniciar projeto' ou comece direto com a descrição do seu problema/projeto. Se tiver dúvidas *depois* que o plano for gerado, pode perguntar diretamente!")
-            print("\n---")
-            print("Pressione Enter para encerrar o túnel Ngrok e o servidor Flask.")
-            input()
-        else:
-            print("Não foi possível obter o URL do Ngrok. Verifique os logs acima para erros.")
-    finally:
-        if ngrok_url:
-            ngrok.kill()
-            print("Túnel Ngrok e servidor Flask encerrados.")
-        else:
-            print("Ngrok não foi iniciado, então não há túnel para encerrar.")
-
-    print("\nProcesso concluído. O bot está offline.")
\ No newline at end of file
+# Célula 1 (Integrada): Instalação das bibliotecas necessárias
+# No Colab as bibliotecas são instaladas aqui mesmo. Fora dele (servidor, contêiner) o script é um
+# módulo Python comum, importável por um servidor WSGI, e as dependências vêm da imagem/ambiente.
+import os
+import sys
+import subprocess
+
+RUNNING_IN_COLAB = "google.colab" in sys.modules
+# Versão da CrewAI para a qual a instrumentação do LLM foi escrita (ver create_crew_llm)
+CREWAI_REQUIREMENT = "crewai[litellm]>=1.0,<2"
+if RUNNING_IN_COLAB and os.getenv("SKIP_PIP_INSTALL", "0") != "1":
+    print("Instalando bibliotecas necessárias (CrewAI, LiteLLM, Langchain Community, Flask, Twilio, PyNgrok)...")
+    subprocess.run([sys.executable, "-m", "pip", "install", "-q", CREWAI_REQUIREMENT, "crewai-tools", "langchain-community", "Flask", "twilio", "pyngrok", "python-dotenv"], check=False)
+    print("Bibliotecas instaladas.")
+
+# Célula 2 (Integrada): Configuração da API Keys e Inicialização da LLM
+import re
+import json
+import hmac
+import base64
+import importlib
+import atexit
+import signal
+import hashlib
+import heapq
+import queue
+import random
+import unicodedata
+import concurrent.futures
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from types import MappingProxyType
+from flask import Flask, request, jsonify
+from twilio.twiml.messaging_response import MessagingResponse
+from werkzeug.serving import run_simple
+
+
+def load_secret(name: str):
+    """
+    Lê um segredo das variáveis de ambiente (produção) ou, se não houver, dos Secrets do Colab.
+    """
+    value = os.getenv(name)
+    if value:
+        return value
+    try:
+        from google.colab import userdata
+    except ImportError:
+        return None
+    return userdata.get(name)
+
+
+# --- Configuração das API Keys do Google Gemini ---
+print("\nConfigurando API Key do Google Gemini...")
+try:
+    google_api_key_value = load_secret('GOOGLE_API_KEY')
+    if not google_api_key_value:
+        raise ValueError("GOOGLE_API_KEY não encontrada no ambiente nem nos Secrets do Colab.")
+    os.environ["GOOGLE_API_KEY"] = google_api_key_value
+    print("✅ API Key do Google Gemini carregada com sucesso.")
+except Exception as e:
+    print(f"❌ ERRO FATAL: Falha ao carregar API Key do Google Gemini: {e}")
+    print("Por favor, defina 'GOOGLE_API_KEY' no ambiente ou nos Colab Secrets.")
+    exit()
+
+# --- Configuração das API Keys da Twilio ---
+print("\nConfigurando API Keys da Twilio...")
+try:
+    twilio_account_sid_value = load_secret('TWILIO_ACCOUNT_SID')
+    twilio_auth_token_value = load_secret('TWILIO_AUTH_TOKEN')
+    twilio_phone_number_value = load_secret('TWILIO_PHONE_NUMBER') # NOVO: seu número da Twilio
+
+    if not all([twilio_account_sid_value, twilio_auth_token_value, twilio_phone_number_value]):
+        raise ValueError("Uma ou mais credenciais da Twilio não encontradas no ambiente nem nos Secrets do Colab.")
+
+    os.environ["TWILIO_ACCOUNT_SID"] = twilio_account_sid_value
+    os.environ["TWILIO_AUTH_TOKEN"] = twilio_auth_token_value
+    os.environ["TWILIO_PHONE_NUMBER"] = twilio_phone_number_value
+    print("✅ API Keys e número de telefone da Twilio carregados com sucesso.")
+
+except Exception as e:
+    print(f"❌ ERRO FATAL: Falha ao carregar API Keys da Twilio: {e}")
+    print("Por favor, defina 'TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN' e 'TWILIO_PHONE_NUMBER' no ambiente ou nos Colab Secrets.")
+    exit()
+
+# --- INICIALIZAÇÃO SOB DEMANDA DO GEMINI LLM E DO CLIENTE TWILIO ---
+# CrewAI, LangChain e o cliente REST da Twilio são importações pesadas. Elas são carregadas
+# apenas no primeiro uso (ou em background logo após o servidor subir, ver preload_heavy_modules),
+# de forma que saudações e comandos simples sejam atendidos segundos após a inicialização.
+_gemini_llm = None
+_twilio_client = None
+_lazy_init_lock = threading.Lock()
+
+
+def get_gemini_llm():
+    global _gemini_llm
+    if _gemini_llm is None:
+        with _lazy_init_lock:
+            if _gemini_llm is None:
+                from langchain_community.chat_models import ChatLiteLLM
+                # Inicializa o modelo Gemini LLM usando ChatLiteLLM
+                _gemini_llm = ChatLiteLLM(
+                    model="gemini/gemini-2.0-flash",
+                    api_key=os.getenv("GOOGLE_API_KEY"),
+                    temperature=0.7,
+                )
+                print("✅ Modelo Gemini LLM configurado com sucesso.")
+    return _gemini_llm
+
+
+def get_twilio_client():
+    global _twilio_client
+    if _twilio_client is None:
+        with _lazy_init_lock:
+            if _twilio_client is None:
+                from twilio.rest import Client # Importar o cliente Twilio
+                from twilio.http.http_client import TwilioHttpClient
+                # Inicializa o cliente Twilio reaproveitando uma sessão HTTP (pool de conexões keep-alive)
+                http_client = TwilioHttpClient(pool_connections=True, timeout=TWILIO_HTTP_TIMEOUT_SECONDS)
+                _twilio_client = Client(os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"], http_client=http_client)
+                print("✅ Cliente Twilio configurado com sucesso.")
+    return _twilio_client
+
+
+def preload_heavy_modules():
+    """
+    Aquece as importações pesadas fora do caminho das respostas imediatas.
+    """
+    try:
+        importlib.import_module("crewai")
+        get_gemini_llm()
+        get_twilio_client()
+        print("DEBUG: Módulos pesados (CrewAI, LangChain, Twilio REST) carregados em background.")
+    except Exception as e:
+        print(f"❌ Erro ao pré-carregar módulos: {e}")
+
+
+# --- MÉTRICAS, LOGS ESTRUTURADOS E ID DE JOB ---
+# Cada mensagem recebida ganha um ID que acompanha o webhook, o job da Crew, cada tarefa, cada
+# chamada ao LLM e cada envio pela Twilio. Os eventos saem como uma linha JSON por evento e os
+# números agregados ficam em histogramas/contadores expostos em /metrics (formato Prometheus).
+METRICS_PREFIX = "whatsapp_bot_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+current_job_usage = contextvars.ContextVar("current_job_usage", default=None)
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def log_event(event: str, **fields):
+    record = {"ts": round(time.time(), 3), "event": event, "job_id": current_job_id.get()}
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas em memória, com rótulos, renderizados no formato texto do Prometheus.
+    Coletores registrados (ex.: estatísticas da fila) viram gauges no momento da leitura.
+    """
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self._prefix = prefix
+        self._counters = {}  # (nome, rótulos) -> valor
+        self._histograms = {}  # (nome, rótulos) -> [buckets, contagens por bucket, soma, contagem]
+        self._collectors = []  # (prefixo, função que retorna dict)
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = [buckets, [0] * len(buckets), 0.0, 0]
+                self._histograms[key] = histogram
+            for i, upper in enumerate(histogram[0]):
+                if value <= upper:
+                    histogram[1][i] += 1
+                    break
+            histogram[2] += value
+            histogram[3] += 1
+
+    def register_collector(self, prefix: str, collect):
+        self._collectors.append((prefix, collect))
+
+    @staticmethod
+    def _format_labels(labels, extra=()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, [v[0], list(v[1]), v[2], v[3]]) for k, v in self._histograms.items())
+        declared = set()
+        for (name, labels), value in counters:
+            full_name = self._prefix + name
+            if full_name not in declared:
+                lines.append(f"# TYPE {full_name} counter")
+                declared.add(full_name)
+            lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            full_name = self._prefix + name
+            if full_name not in declared:
+                lines.append(f"# TYPE {full_name} histogram")
+                declared.add(full_name)
+            cumulative = 0
+            for upper, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{full_name}_bucket{self._format_labels(labels, [('le', upper)])} {cumulative}")
+            lines.append(f"{full_name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{full_name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{full_name}_count{self._format_labels(labels)} {count}")
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                print(f"❌ Erro ao coletar métricas '{prefix}': {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                full_name = f"{self._prefix}{prefix}_{key}"
+                lines.append(f"# TYPE {full_name} gauge")
+                lines.append(f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+class JobUsage:
+    """
+    Acumula, para um job, o número de chamadas ao LLM, os tokens e os erros, além do caminho do
+    pipeline de planejamento seguido (ver run_planning_pipeline).
+    """
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.errors = 0
+        self.planning_path = None
+        self.validation = None
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, error: bool):
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.errors += int(error)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "llm_calls": self.llm_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "llm_errors": self.errors,
+                "planning_path": self.planning_path,
+                "validation": self.validation,
+            }
+
+
+def estimate_tokens(content) -> int:
+    """
+    Estimativa barata de tokens (~4 caracteres por token) para textos ou listas de mensagens.
+    """
+    if content is None:
+        return 0
+    if isinstance(content, (list, tuple)):
+        return sum(estimate_tokens(item.get("content") if isinstance(item, dict) else item) for item in content)
+    return max(1, len(str(content)) // 4)
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    max_chars = token_budget * 4
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def record_llm_call(model: str, seconds: float, prompt_tokens: int, completion_tokens: int, error: Exception = None):
+    stage = current_stage.get() or "unknown"
+    status = "error" if error else "ok"
+    metrics.inc("llm_calls_total", stage=stage, status=status)
+    metrics.observe("llm_call_seconds", seconds, stage=stage)
+    metrics.inc("llm_prompt_tokens_total", prompt_tokens, stage=stage)
+    metrics.inc("llm_completion_tokens_total", completion_tokens, stage=stage)
+    usage = current_job_usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, error is not None)
+    log_event("llm_call", stage=stage, model=model, seconds=round(seconds, 3), prompt_tokens=prompt_tokens,
+              completion_tokens=completion_tokens, status=status, error=str(error) if error else None)
+
+
+_instrumented_llm_class = None
+
+
+def create_crew_llm(model: str = "gemini/gemini-2.0-flash", temperature: float = 0.7, **kwargs):
+    """
+    LLM da CrewAI com instrumentação: cada chamada passa pelo governador (prioridade "background")
+    e registra tempo, tokens e erros no job corrente.
+    A partir da CrewAI 1.0, LLM(...) devolve a classe nativa do provedor (GeminiCompletion para
+    "gemini/...") em vez da subclasse, e a instrumentação e o governador seriam pulados em silêncio.
+    Forçamos o caminho do LiteLLM (is_litellm=True e sem provedor nativo), que mantém a subclasse;
+    se ainda assim vier outra classe, falha aqui.
+    """
+    global _instrumented_llm_class
+    if _instrumented_llm_class is None:
+        from crewai import LLM
+
+        class InstrumentedLLM(LLM):
+            @classmethod
+            def _get_native_provider(cls, provider):
+                # Na 1.0 o LLM.__new__ importa a classe nativa antes de olhar is_litellm (e falha
+                # sem google-genai instalado): sempre via LiteLLM
+                return None
+
+            def __init__(self, *args, is_litellm: bool = True, **kwargs):
+                # O LLM.__new__ recebe is_litellm; aqui ele não pode ir para os parâmetros do LiteLLM
+                super().__init__(*args, **kwargs)
+                self.is_litellm = is_litellm
+
+            def call(self, messages, *args, **kwargs):
+                parent_call = super().call
+                prompt_tokens = estimate_tokens(messages)
+
+                def timed_call():
+                    started = time.perf_counter()
+                    try:
+                        result = parent_call(messages, *args, **kwargs)
+                    except Exception as e:
+                        record_llm_call(self.model, time.perf_counter() - started, prompt_tokens, 0, error=e)
+                        raise
+                    record_llm_call(self.model, time.perf_counter() - started, prompt_tokens, estimate_tokens(result))
+                    return result
+
+                return llm_governor.call(timed_call, priority="background", estimated_tokens=prompt_tokens + LLM_COMPLETION_TOKENS_ESTIMATE)
+
+        _instrumented_llm_class = InstrumentedLLM
+    llm = _instrumented_llm_class(model=model, api_key=os.getenv("GOOGLE_API_KEY"), temperature=temperature, is_litellm=True, **kwargs)
+    if not isinstance(llm, _instrumented_llm_class):
+        raise RuntimeError(
+            f"A CrewAI devolveu {type(llm).__name__} para '{model}' em vez do LLM instrumentado: as chamadas "
+            f"não passariam pelo governador. Instale {CREWAI_REQUIREMENT}."
+        )
+    return llm
+
+
+# --- DEFINIÇÃO DOS AGENTES PARA O FLUXO DE ASSISTÊNCIA AO PROJETO DO USUÁRIO ---
+# As definições são moldes imutáveis: a CrewAI escreve descrições interpoladas e saídas nos
+# objetos Agent/Task, então cada job recebe suas próprias instâncias (ver create_planning_agents).
+@dataclass(frozen=True)
+class AgentSpec:
+    role: str
+    goal: str
+    backstory: str
+    allow_delegation: bool = False
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    agent_key: str
+    description: str
+    expected_output: str
+
+
+PLANNING_AGENT_SPECS = MappingProxyType({
+    'pesquisador_mercado': AgentSpec(
+        role='Especialista em Pesquisa e Tendências de Mercado',
+        goal='Investigar tendências, tecnologias e soluções existentes relevantes para a demanda de projeto do usuário, fornecendo insights para o debate.',
+        backstory='Você é um pesquisador incansável, sempre em busca de informações atualizadas para embasar decisões de projeto e identificar oportunidades.',
+        allow_delegation=False
+    ),
+    'estrategista_tecnico': AgentSpec(
+        role='Estrategista de Soluções e Facilitador de Debate',
+        goal='Liderar o debate para conceituar a melhor abordagem técnica e funcional para o projeto do usuário, considerando viabilidade, inovação e escalabilidade.',
+        backstory='Com vasta experiência em arquitetura de sistemas e metodologias ágeis, você facilita a discussão e direciona a equipe para soluções eficazes e criativas.',
+        allow_delegation=True
+    ),
+    'consolidor_de_prompt': AgentSpec(
+        role='Engenheiro de Prompt e Consolidador de Requisitos',
+        goal='Transformar todas as discussões, pesquisas e debates em um prompt técnico claro, conciso e completo, pronto para ser validado pela equipe externa.',
+        backstory='Você é um mestre na arte de resumir e estruturar informações complexas em documentos técnicos de alta qualidade e prompts acionáveis, garantindo que nada essencial seja perdido.',
+        allow_delegation=False
+    ),
+    'validador_de_prompt_externo': AgentSpec(
+        role='Analista de Validação Externa e Qualidade de Prompt',
+        goal='Validar a qualidade, clareza e completude do prompt técnico gerado, garantindo que ele atenda à demanda original do usuário e esteja pronto para a equipe de execução.',
+        backstory='Seu foco é a qualidade e a experiência do usuário final. Você garante que o prompt seja compreensível, útil e alinhado com as expectativas do cliente para quem vai executá-lo, identificando falhas e sugerindo aprimoramentos.',
+        allow_delegation=False
+    ),
+})
+
+
+# Perfil de modelo de cada agente. Etapas leves (pesquisa, validação) podem usar um modelo mais
+# rápido/barato e respostas mais curtas; cada campo pode ser trocado por variável de ambiente, por
+# exemplo AGENT_VALIDADOR_DE_PROMPT_EXTERNO_MODEL=gemini/gemini-2.0-flash-lite.
+PLANNING_DEFAULT_MODEL = os.getenv("PLANNING_DEFAULT_MODEL", "gemini/gemini-2.0-flash")
+
+
+@dataclass(frozen=True)
+class LLMProfile:
+    model: str
+    temperature: float
+    max_tokens: int = None
+
+
+def llm_profile_from_env(agent_key: str, temperature: float, max_tokens: int = None) -> LLMProfile:
+    prefix = f"AGENT_{agent_key.upper()}_"
+    max_tokens = os.getenv(prefix + "MAX_TOKENS", str(max_tokens or ""))
+    return LLMProfile(
+        model=os.getenv(prefix + "MODEL", PLANNING_DEFAULT_MODEL),
+        temperature=float(os.getenv(prefix + "TEMPERATURE", str(temperature))),
+        max_tokens=int(max_tokens) if max_tokens else None
+    )
+
+
+PLANNING_LLM_PROFILES = MappingProxyType({
+    'pesquisador_mercado': llm_profile_from_env('pesquisador_mercado', temperature=0.3, max_tokens=1024),
+    'estrategista_tecnico': llm_profile_from_env('estrategista_tecnico', temperature=0.7, max_tokens=1536),
+    'consolidor_de_prompt': llm_profile_from_env('consolidor_de_prompt', temperature=0.4, max_tokens=2048),
+    'validador_de_prompt_externo': llm_profile_from_env('validador_de_prompt_externo', temperature=0.2, max_tokens=1024),
+})
+
+print("\nAgentes para Assistência de Projetos (fluxo do usuário) definidos.")
+
+
+# --- DEFINIÇÃO DAS TAREFAS PARA O FLUXO DE ASSISTÊNCIA AO PROJETO DO USUÁRIO ---
+# A ordem da tupla é a ordem de execução do Process.sequential.
+PLANNING_TASK_SPECS = (
+    ('pesquisar_demanda_task', TaskSpec(
+        agent_key='pesquisador_mercado',
+        description="{demanda_usuario} - Pesquisar e coletar informações relevantes sobre a demanda do usuário. Identifique os requisitos funcionais e não-funcionais, tecnologias mencionadas e desafios potenciais. Prepare um resumo para o debate.",
+        expected_output="Um resumo detalhado da demanda do usuário, incluindo pontos chave, tecnologias, escopo inicial e quaisquer incertezas a serem discutidas."
+    )),
+    ('debater_e_conceituar_task', TaskSpec(
+        agent_key='estrategista_tecnico',
+        description="Com base na pesquisa da demanda e em conhecimentos técnicos, debata as melhores abordagens e soluções técnicas para o projeto do usuário. O objetivo é conceituar a estrutura do projeto, tecnologias principais e um plano de alto nível, considerando viabilidade, inovação e escalabilidade.",
+        expected_output="Um rascunho de plano de projeto de alto nível, com a estrutura da solução, tecnologias principais debatidas e possíveis alternativas."
+    )),
+    ('consolidar_em_prompt_task', TaskSpec(
+        agent_key='consolidor_de_prompt',
+        description="Consolidar os resultados da pesquisa e do debate em um *prompt técnico detalhado*. Este prompt deve ser um guia claro e acionável para a equipe de execução, incluindo: visão geral do projeto, requisitos funcionais, requisitos técnicos, tecnologias sugeridas, e a estrutura de módulos/componentes.",
+        expected_output="Um prompt técnico completo e bem estruturado, pronto para ser validado, contendo todos os detalhes essenciais para iniciar o desenvolvimento (formato Markdown)."
+    )),
+    ('validar_e_apresentar_prompt_task', TaskSpec(
+        agent_key='validador_de_prompt_externo',
+        description="Revise o prompt técnico final gerado a partir da demanda '{demanda_usuario}'. Valide sua clareza, completude, alinhamento com a demanda original do usuário, e se ele está pronto para ser entregue à equipe de execução. Formate a saída para uma apresentação amigável e concisa ao usuário do WhatsApp, incluindo um resumo do plano e indicando que ele foi validado, além de mencionar os próximos passos (que a equipe de execução vai trabalhar nisso). Se houver correções, inclua-as de forma clara. Mantenha a resposta concisa para WhatsApp.",
+        expected_output="O prompt técnico final validado ou um relatório conciso com sugestões de correção. O output deve ser direto para o usuário do WhatsApp, com um resumo do plano e os próximos passos claros."
+    )),
+)
+
+# Etapa única que substitui pesquisa + debate nas demandas simples (ver PipelinePlanner)
+MERGED_RESEARCH_TASK_KEY = 'pesquisar_e_conceituar_task'
+MERGED_RESEARCH_TASK_SPEC = TaskSpec(
+    agent_key='estrategista_tecnico',
+    description="{demanda_usuario} - Analise a demanda do usuário e, na mesma resposta, conceitue a solução. A demanda é simples: seja objetivo e organize a saída nas seções Requisitos, Tecnologias, Módulos e componentes, Riscos e desafios, e Plano de alto nível.",
+    expected_output="Um resumo da demanda com requisitos, tecnologias sugeridas, estrutura de módulos/componentes, riscos e um plano de alto nível."
+)
+
+PLANNING_TASK_SPECS_BY_KEY = MappingProxyType({**dict(PLANNING_TASK_SPECS), MERGED_RESEARCH_TASK_KEY: MERGED_RESEARCH_TASK_SPEC})
+
+print("\nTarefas para Assistência de Projetos (fluxo do usuário) definidas.")
+
+
+def create_planning_agents(llm=None, verbose: bool = True, allow_delegation: bool = True, keys=None) -> dict:
+    """
+    Cria instâncias novas dos agentes de planejamento para um único job, a partir dos moldes
+    imutáveis. Assim vários jobs podem rodar em paralelo sem que um sobrescreva as descrições
+    interpoladas ou as saídas do outro. Sem `llm`, cada agente usa o seu perfil de
+    PLANNING_LLM_PROFILES; com `allow_delegation=False` nenhum agente delega. `keys` limita
+    quais agentes são criados.
+    """
+    from crewai import Agent
+
+    llms = {}
+    agents = {}
+    for key, spec in PLANNING_AGENT_SPECS.items():
+        if keys is not None and key not in keys:
+            continue
+        agent_llm = llm
+        if agent_llm is None:
+            profile = PLANNING_LLM_PROFILES[key]
+            if profile not in llms:
+                extra = {"max_tokens": profile.max_tokens} if profile.max_tokens else {}
+                llms[profile] = create_crew_llm(model=profile.model, temperature=profile.temperature, **extra)
+            agent_llm = llms[profile]
+        agents[key] = Agent(
+            role=spec.role,
+            goal=spec.goal,
+            backstory=spec.backstory,
+            llm=agent_llm,
+            verbose=verbose,
+            allow_delegation=spec.allow_delegation and allow_delegation
+        )
+    return agents
+
+
+def create_stage_crew(task_key: str, agents: dict, verbose: bool = True, callback=None, with_context: bool = False,
+                      spec: TaskSpec = None):
+    """
+    Monta uma Crew de uma única tarefa do pipeline de planejamento. Com `with_context`, a descrição
+    recebe o contexto das etapas anteriores pelo input `{contexto}` (ver build_stage_context).
+    `spec` substitui o molde de PLANNING_TASK_SPECS_BY_KEY (usado pelas subtarefas da pesquisa).
+    Se o agente da tarefa pode delegar, os demais agentes entram na Crew como colegas: a CrewAI só
+    oferece as ferramentas de delegação quando há outros agentes na Crew.
+    """
+    from crewai import Task, Crew, Process
+
+    spec = spec or PLANNING_TASK_SPECS_BY_KEY[task_key]
+    agent = agents[spec.agent_key]
+    description = spec.description
+    if with_context:
+        description += "\n\nContexto das etapas anteriores:\n{contexto}"
+    task = Task(
+        description=description,
+        expected_output=spec.expected_output,
+        agent=agent,
+        callback=callback
+    )
+    coworkers = [other for other in agents.values() if other is not agent] if agent.allow_delegation else []
+    # Toda chamada das Crews precisa passar pelo governador, que só existe no LLM instrumentado
+    for member in [agent] + coworkers:
+        if not isinstance(member.llm, _instrumented_llm_class or ()):
+            raise RuntimeError(f"O agente '{member.role}' não usa o LLM de create_crew_llm: suas chamadas escapariam do governador.")
+    return Crew(
+        agents=[agent] + coworkers,
+        tasks=[task],
+        process=Process.sequential,
+        manager_llm=agent.llm,
+        llm=agent.llm,
+        verbose=verbose
+    )
+
+
+def merge_task_callbacks(*callback_maps) -> dict:
+    """
+    Combina vários mapas `tarefa -> callback` em um só, chamando os callbacks na ordem dada.
+    """
+    merged = {}
+    for callback_map in callback_maps:
+        for task_key, callback in callback_map.items():
+            merged.setdefault(task_key, []).append(callback)
+    return {
+        task_key: (lambda output, callbacks=callbacks: [callback(output) for callback in callbacks])
+        for task_key, callbacks in merged.items()
+    }
+
+
+class CrewStageTimer:
+    """
+    Mede o tempo de parede de cada tarefa da Crew sequencial (do fim da anterior ao fim da atual)
+    e marca a etapa corrente, usada para atribuir as chamadas ao LLM à tarefa certa.
+    """
+    def __init__(self, task_keys):
+        self._task_keys = list(task_keys)
+        self._last_mark = None
+
+    def start(self):
+        self._last_mark = time.monotonic()
+        current_stage.set(self._task_keys[0])
+
+    def task_callbacks(self) -> dict:
+        return {task_key: (lambda output, task_key=task_key: self.on_task_done(task_key)) for task_key in self._task_keys}
+
+    def on_task_done(self, task_key: str):
+        now = time.monotonic()
+        seconds = now - self._last_mark
+        self._last_mark = now
+        metrics.observe("crew_task_seconds", seconds, task=task_key)
+        log_event("crew_task_done", task=task_key, seconds=round(seconds, 3))
+        index = self._task_keys.index(task_key)
+        current_stage.set(self._task_keys[index + 1] if index + 1 < len(self._task_keys) else None)
+
+
+# --- PASSAGEM DE CONTEXTO COMPACTA ENTRE AS ETAPAS DO PLANEJAMENTO ---
+# No Process.sequential cada tarefa recebe a saída bruta de todas as anteriores, e o prompt cresce a
+# cada etapa. Aqui as etapas rodam uma a uma e, entre elas, a saída de cada etapa é reduzida aos
+# campos estruturados que a próxima realmente usa (requisitos, tecnologias, módulos...), dentro de
+# um orçamento de tokens por etapa. CONTEXT_HANDOFF_MODE="full" restaura a passagem integral.
+CONTEXT_HANDOFF_MODE = os.getenv("CONTEXT_HANDOFF_MODE", "compact").lower()
+
+# Para cada etapa: de quais etapas anteriores ela precisa e quantos tokens de contexto pode receber.
+# A validação precisa do prompt consolidado praticamente inteiro, mas não da pesquisa nem do debate.
+STAGE_HANDOFF = MappingProxyType({
+    'debater_e_conceituar_task': (('pesquisar_demanda_task',), int(os.getenv("HANDOFF_BUDGET_DEBATE", "700"))),
+    'consolidar_em_prompt_task': (('pesquisar_demanda_task', 'debater_e_conceituar_task', MERGED_RESEARCH_TASK_KEY), int(os.getenv("HANDOFF_BUDGET_CONSOLIDATE", "1200"))),
+    'validar_e_apresentar_prompt_task': (('consolidar_em_prompt_task',), int(os.getenv("HANDOFF_BUDGET_VALIDATE", "2000"))),
+})
+
+# Campos extraídos das saídas em Markdown, com os radicais (sem acento) que identificam cada seção
+HANDOFF_FIELDS = (
+    ("Requisitos", ("requisit", "funcionalidade", "escopo", "objetivo")),
+    ("Tecnologias", ("tecnolog", "stack", "ferramenta", "framework", "linguagem", "banco de dados")),
+    ("Módulos e componentes", ("modulo", "componente", "estrutura", "arquitetura", "camada")),
+    ("Riscos e desafios", ("risco", "desafio", "restric", "incerteza", "limitac")),
+    ("Plano", ("plano", "etapa", "fase", "cronograma", "roadmap", "proximos passos")),
+)
+
+_HEADING_RE = re.compile(r"^\s*(?:#{1,6}\s+(.+?)\s*#*|\*\*(.+?)\*\*:?|([^.:]{3,80}):)\s*$")
+_BULLET_RE = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+")
+
+
+def _heading_level(line: str) -> int:
+    # "#" a "######" -> 1 a 6; títulos em negrito ou "Título:" contam como o nível mais baixo
+    stripped = line.lstrip()
+    return len(stripped) - len(stripped.lstrip("#")) if stripped.startswith("#") else 7
+
+
+def extract_structured_fields(text: str) -> dict:
+    """
+    Agrupa as linhas do texto pelos campos de HANDOFF_FIELDS, usando os títulos (Markdown, negrito
+    ou "Título:") para saber em qual seção cada linha está. Um subtítulo que não corresponde a
+    nenhum campo (ex. "### Frontend" dentro de "## Tecnologias") continua no campo atual, e vira
+    uma linha "Frontend:"; um título do mesmo nível ou acima encerra o campo. Linhas fora dessas
+    seções são ignoradas.
+    """
+    fields = OrderedDict((name, []) for name, _ in HANDOFF_FIELDS)
+    current_field = None
+    current_level = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        heading = _HEADING_RE.match(line)
+        if heading:
+            raw_title = next(group for group in heading.groups() if group)
+            title = normalize_demand(raw_title)
+            level = _heading_level(line)
+            matched = next((name for name, stems in HANDOFF_FIELDS if any(stem in title for stem in stems)), None)
+            if matched is not None:
+                current_field, current_level = matched, level
+            elif current_field is not None and level > current_level:
+                fields[current_field].append(f"{raw_title.strip().rstrip(':')}:")
+            else:
+                current_field = None
+            continue
+        if current_field is not None:
+            fields[current_field].append(_BULLET_RE.sub("- ", line.strip(), count=1))
+    return OrderedDict((name, lines) for name, lines in fields.items() if lines)
+
+
+def compact_stage_outputs(outputs, token_budget: int) -> str:
+    """
+    Resume as saídas `[(etapa, texto)]` nos campos estruturados, distribuindo o orçamento de tokens
+    entre os campos (um item de cada campo por vez). Sem campos reconhecíveis, usa o início do texto.
+    """
+    merged = OrderedDict()
+    unstructured = []
+    for _, text in outputs:
+        fields = extract_structured_fields(text)
+        if not fields:
+            unstructured.append(text)
+        for name, lines in fields.items():
+            merged.setdefault(name, []).extend(lines)
+
+    used = 0
+    selected = OrderedDict((name, []) for name in merged)
+    pending = OrderedDict((name, deque(lines)) for name, lines in merged.items())
+    while any(pending.values()):
+        for name, lines in pending.items():
+            if not lines:
+                continue
+            line = lines.popleft()
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                lines.clear()
+                continue
+            selected[name].append(line)
+            used += cost
+
+    sections = [f"{name}:\n" + "\n".join(lines) for name, lines in selected.items() if lines]
+    remaining = token_budget - used
+    for text in unstructured:
+        if remaining <= 0:
+            break
+        excerpt = truncate_to_tokens(text.strip(), remaining)
+        sections.append(excerpt)
+        remaining -= estimate_tokens(excerpt)
+    return "\n\n".join(sections)
+
+
+def build_stage_context(task_key: str, user_message: str, outputs: dict, mode: str = CONTEXT_HANDOFF_MODE) -> str:
+    """
+    Monta o contexto que a etapa `task_key` recebe e registra os tokens antes/depois da compactação.
+    """
+    full_context = "\n\n".join(outputs.values())
+    if mode == "full" or task_key not in STAGE_HANDOFF:
+        context = full_context
+    else:
+        needed, budget = STAGE_HANDOFF[task_key]
+        needed_outputs = [(key, outputs[key]) for key in needed if key in outputs]
+        # O resumo da pesquisa em paralelo já vem numa seção por campo, cada uma limitada por
+        # RESEARCH_ASPECT_MAX_TOKENS: reextraí-lo para o orçamento cortaria as alternativas e
+        # soluções existentes que os aspectos pedem
+        fanned_out = RESEARCH_FANOUT_MODE == "parallel" and [key for key, _ in needed_outputs] == [RESEARCH_TASK_KEY]
+        if len(needed_outputs) == 1 and (fanned_out or estimate_tokens(needed_outputs[0][1]) <= budget):
+            # Já cabe no orçamento: passa a saída como está
+            context = needed_outputs[0][1]
+        else:
+            context = compact_stage_outputs(needed_outputs, budget)
+    context = f"Demanda do usuário: {user_message}\n\n{context}"
+    tokens_before = estimate_tokens(full_context)
+    tokens_after = estimate_tokens(context)
+    metrics.inc("context_tokens_before_total", tokens_before, task=task_key)
+    metrics.inc("context_tokens_after_total", tokens_after, task=task_key)
+    log_event("context_handoff", task=task_key, mode=mode, tokens_before=tokens_before, tokens_after=tokens_after)
+    return context
+
+
+# --- PESQUISA EM PARALELO POR ASPECTOS (FAN-OUT) ---
+# A pesquisa é a etapa mais lenta: uma única geração longa cobrindo requisitos, tecnologias e
+# riscos. Com RESEARCH_FANOUT_MODE="parallel", cada aspecto vira uma subtarefa independente,
+# executada ao mesmo tempo que as outras, e os resultados são juntados no resumo que o debate
+# recebe. O tempo da etapa passa a ser o do aspecto mais lento, e não a soma. As chamadas
+# continuam passando pelo governador do LLM (LLM_MAX_CONCURRENCY).
+RESEARCH_FANOUT_MODE = os.getenv("RESEARCH_FANOUT_MODE", "off").lower()
+# Cada aspecto cobre ~1/3 da pesquisa: limita a saída para que nenhum vire uma geração longa
+RESEARCH_ASPECT_MAX_TOKENS = int(os.getenv("RESEARCH_ASPECT_MAX_TOKENS", "512"))
+
+RESEARCH_TASK_KEY = 'pesquisar_demanda_task'
+
+# (aspecto, título da seção no resumo, molde da subtarefa). Os títulos batem com HANDOFF_FIELDS,
+# para a consolidação, que junta a pesquisa ao debate; o debate recebe o resumo inteiro.
+RESEARCH_ASPECT_SPECS = (
+    ('requisitos', 'Requisitos', TaskSpec(
+        agent_key='pesquisador_mercado',
+        description="{demanda_usuario} - Levante apenas os requisitos da demanda do usuário: requisitos funcionais (o que o sistema deve fazer e para quem) e não-funcionais (desempenho, segurança, disponibilidade, privacidade). Responda em tópicos curtos.",
+        expected_output="Lista em tópicos dos requisitos funcionais e não-funcionais da demanda."
+    )),
+    ('tecnologias', 'Tecnologias', TaskSpec(
+        agent_key='pesquisador_mercado',
+        description="{demanda_usuario} - Levante apenas o panorama tecnológico da demanda do usuário: tecnologias mencionadas, alternativas adequadas, serviços e soluções existentes no mercado que possam ser reaproveitados. Responda em tópicos curtos.",
+        expected_output="Lista em tópicos das tecnologias e soluções existentes relevantes, com uma linha de justificativa cada."
+    )),
+    ('riscos', 'Riscos e desafios', TaskSpec(
+        agent_key='pesquisador_mercado',
+        description="{demanda_usuario} - Levante apenas os riscos, restrições (prazo, orçamento, privacidade, regulação) e incertezas da demanda do usuário que precisam ser discutidos antes de definir a solução. Responda em tópicos curtos.",
+        expected_output="Lista em tópicos dos riscos, restrições e incertezas da demanda."
+    )),
+)
+
+# Por padrão, uma thread por aspecto de cada worker da Crew (CREW_WORKERS), para que as subtarefas
+# de um job não esperem as de outro
+RESEARCH_FANOUT_WORKERS = int(os.getenv("RESEARCH_FANOUT_WORKERS", str(len(RESEARCH_ASPECT_SPECS) * int(os.getenv("CREW_WORKERS", "2")))))
+
+research_executor = concurrent.futures.ThreadPoolExecutor(max_workers=RESEARCH_FANOUT_WORKERS, thread_name_prefix="research")
+
+
+def _run_research_aspect(aspect: str, spec: TaskSpec, user_message: str, llm, verbose: bool):
+    # Roda numa cópia do contexto do job: chamadas ao LLM contam para o job, na etapa do aspecto
+    current_stage.set(f"{RESEARCH_TASK_KEY}:{aspect}")
+    started = time.monotonic()
+    # Cada subtarefa tem o seu agente: a CrewAI altera o estado do Agent durante a execução
+    agents = create_planning_agents(llm=llm, verbose=verbose, allow_delegation=False, keys=(spec.agent_key,))
+    crew = create_stage_crew(RESEARCH_TASK_KEY, agents, verbose=verbose, spec=spec)
+    output = str(crew.kickoff(inputs={'demanda_usuario': user_message}))
+    return output, time.monotonic() - started
+
+
+def run_research_fanout(user_message: str, llm=None, verbose: bool = True) -> str:
+    """
+    Executa os aspectos de RESEARCH_ASPECT_SPECS em paralelo e junta as saídas, uma seção por
+    aspecto. Sem `llm`, usa o perfil do pesquisador com saída limitada a RESEARCH_ASPECT_MAX_TOKENS.
+    Um aspecto que falhar fica de fora; se todos falharem, o erro é propagado.
+    """
+    if llm is None:
+        profile = PLANNING_LLM_PROFILES['pesquisador_mercado']
+        llm = create_crew_llm(model=profile.model, temperature=profile.temperature, max_tokens=RESEARCH_ASPECT_MAX_TOKENS)
+    started = time.monotonic()
+    futures = [
+        (aspect, title, research_executor.submit(contextvars.copy_context().run, _run_research_aspect, aspect, spec, user_message, llm, verbose))
+        for aspect, title, spec in RESEARCH_ASPECT_SPECS
+    ]
+    sections = []
+    timings = {}
+    last_error = None
+    for aspect, title, future in futures:
+        try:
+            output, seconds = future.result()
+        except Exception as e:
+            last_error = e
+            print(f"❌ Erro no aspecto '{aspect}' da pesquisa: {e}")
+            metrics.inc("research_aspects_failed_total", aspect=aspect)
+            continue
+        timings[aspect] = round(seconds, 3)
+        metrics.observe("research_aspect_seconds", seconds, aspect=aspect)
+        sections.append(f"## {title}\n{output.strip()}")
+    if not sections:
+        raise last_error
+    wall_seconds = time.monotonic() - started
+    log_event("research_fanout", aspects=timings, wall_seconds=round(wall_seconds, 3), serial_seconds=round(sum(timings.values()), 3))
+    return "\n\n".join(sections)
+
+
+# --- PROFUNDIDADE ADAPTATIVA DO PIPELINE DE PLANEJAMENTO ---
+# Uma ideia de 20 palavras não precisa das mesmas quatro etapas (nem da delegação do estrategista)
+# que uma especificação detalhada. O planner escolhe o caminho pela complexidade da demanda:
+#   "full"   -> pesquisa, debate, consolidação e validação
+#   "simple" -> pesquisa e conceito numa etapa só, consolidação e validação, sem delegação
+# Em qualquer caminho a validação é pulada quando o prompt consolidado passa nas verificações
+# estruturais (PLANNING_VALIDATION_MODE="auto"). PLANNING_DEPTH força um caminho ("full"/"simple").
+PLANNING_DEPTH = os.getenv("PLANNING_DEPTH", "auto").lower()
+PLANNING_VALIDATION_MODE = os.getenv("PLANNING_VALIDATION_MODE", "auto").lower()
+# "auto" -> delegação só no caminho completo; "on"/"off" -> sempre ligada/desligada
+PLANNING_DELEGATION = os.getenv("PLANNING_DELEGATION", "auto").lower()
+
+VALIDATION_TASK_KEY = 'validar_e_apresentar_prompt_task'
+
+PLANNING_PATHS = MappingProxyType({
+    'full': tuple(task_key for task_key, _ in PLANNING_TASK_SPECS),
+    'simple': (MERGED_RESEARCH_TASK_KEY, 'consolidar_em_prompt_task', VALIDATION_TASK_KEY),
+})
+
+PLANNING_DEPTH_CONFIG = MappingProxyType({
+    # Demandas simples: até tantas palavras, termos técnicos distintos e itens numa mesma lista
+    "simple_max_words": int(os.getenv("PLANNING_SIMPLE_MAX_WORDS", "40")),
+    "simple_max_keywords": int(os.getenv("PLANNING_SIMPLE_MAX_KEYWORDS", "2")),
+    "simple_max_list_items": int(os.getenv("PLANNING_SIMPLE_MAX_LIST_ITEMS", "4")),
+    # Um trecho entre separadores só conta como item de lista se for curto ("o endereço"); trechos
+    # longos são orações ("um site simples para minha padaria mostrar o cardápio")
+    "list_item_max_words": int(os.getenv("PLANNING_LIST_ITEM_MAX_WORDS", "4")),
+    # Termos (sem acento) que costumam exigir pesquisa e debate próprios
+    "complex_keywords": (
+        "integracao", "integrado", "api", "pagamento", "tempo real", "rastreamento", "relatorio",
+        "painel", "dashboard", "machine learning", "inteligencia artificial", "modelo de ia", "ia",
+        "seguranca", "autenticacao", "multi", "escalavel", "escalabilidade", "microsservico",
+        "prontuario", "notificacao", "offline", "sincronizacao", "migracao", "legado",
+    ),
+    # Verificações estruturais que dispensam a validação
+    "skip_validation_min_fields": int(os.getenv("PLANNING_SKIP_VALIDATION_MIN_FIELDS", "3")),
+    "skip_validation_required_fields": ("Requisitos", "Tecnologias"),
+    "skip_validation_max_tokens": int(os.getenv("PLANNING_SKIP_VALIDATION_MAX_TOKENS", "1200")),
+})
+
+PLAN_AUTO_VALIDATED_FOOTER = "✅ Plano verificado automaticamente. Próximos passos: a equipe de execução vai trabalhar a partir deste prompt técnico."
+
+
+@dataclass(frozen=True)
+class PipelinePlan:
+    path: str
+    stages: tuple
+    reason: str
+    word_count: int
+    keywords: int
+    list_items: int
+    allow_delegation: bool
+
+
+class PipelinePlanner:
+    """
+    Escolhe o caminho do pipeline pela complexidade da demanda: número de palavras, termos técnicos
+    de PLANNING_DEPTH_CONFIG e tamanho da maior enumeração, cada um com o seu limite.
+    """
+    def __init__(self, config=PLANNING_DEPTH_CONFIG, depth: str = PLANNING_DEPTH, delegation: str = PLANNING_DELEGATION):
+        self.config = config
+        self.depth = depth
+        self.delegation = delegation
+        keywords = sorted(config["complex_keywords"], key=len, reverse=True)
+        self._keywords_re = re.compile(r"\b(?:" + "|".join(re.escape(word) for word in keywords) + r")\b")
+        self._separator_re = re.compile(r"\s*[,;]\s*|\s+e\s+")
+        self._sentence_re = re.compile(r"[.!?:\n]+")
+        self._bullet_re = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+", re.MULTILINE)
+
+    def count_list_items(self, text: str) -> int:
+        """
+        Itens da maior enumeração da demanda: linhas com marcador ou, numa frase, uma sequência de
+        trechos curtos separados por vírgula, ";" ou " e " (o primeiro item pode ser o fim de uma
+        oração longa, como em "mostrar o cardápio, o endereço e o horário").
+        """
+        longest = len(self._bullet_re.findall(text))
+        for sentence in self._sentence_re.split(text.lower()):
+            run = 0
+            for segment in self._separator_re.split(sentence):
+                words = len(segment.split())
+                if not words:
+                    continue
+                run = run + 1 if run and words <= self.config["list_item_max_words"] else 1
+                longest = max(longest, run)
+        return longest
+
+    def plan(self, user_message: str) -> PipelinePlan:
+        normalized = normalize_demand(user_message)
+        word_count = len(normalized.split())
+        keywords = len(set(self._keywords_re.findall(normalized)))
+        list_items = self.count_list_items(user_message)
+        if self.depth in PLANNING_PATHS:
+            path, reason = self.depth, "forced"
+        elif word_count > self.config["simple_max_words"]:
+            path, reason = "full", "long_demand"
+        elif keywords > self.config["simple_max_keywords"]:
+            path, reason = "full", "many_keywords"
+        elif list_items > self.config["simple_max_list_items"]:
+            path, reason = "full", "long_list"
+        else:
+            path, reason = "simple", "simple_demand"
+        allow_delegation = self.delegation == "on" or (self.delegation == "auto" and path == "full")
+        return PipelinePlan(path, PLANNING_PATHS[path], reason, word_count, keywords, list_items, allow_delegation)
+
+
+pipeline_planner = PipelinePlanner()
+
+
+def check_plan_structure(text: str, config=PLANNING_DEPTH_CONFIG) -> list:
+    """
+    Verificações baratas do prompt consolidado. Retorna a lista de problemas encontrados; lista
+    vazia significa que a validação por LLM pode ser dispensada.
+    """
+    problems = []
+    fields = extract_structured_fields(text)
+    if len(fields) < config["skip_validation_min_fields"]:
+        problems.append(f"only_{len(fields)}_fields")
+    problems.extend(f"missing_{normalize_demand(name)}" for name in config["skip_validation_required_fields"] if name not in fields)
+    if estimate_tokens(text) > config["skip_validation_max_tokens"]:
+        problems.append("too_long")
+    return problems
+
+
+def will_skip_validation(consolidated: str) -> bool:
+    """
+    A validação por LLM é dispensada quando o prompt consolidado passa nas verificações
+    estruturais (PLANNING_VALIDATION_MODE="auto").
+    """
+    return PLANNING_VALIDATION_MODE == "auto" and not check_plan_structure(consolidated)
+
+
+def run_planning_pipeline(user_message: str, verbose: bool = True, task_callbacks: dict = None, plan: PipelinePlan = None) -> str:
+    """
+    Executa as etapas do caminho escolhido em sequência, uma Crew de uma tarefa por etapa, passando
+    entre elas o contexto montado por build_stage_context. Retorna a saída da última etapa executada
+    e registra no job o caminho seguido.
+    """
+    plan = plan or pipeline_planner.plan(user_message)
+    agents = create_planning_agents(verbose=verbose, allow_delegation=plan.allow_delegation)
+    task_callbacks = task_callbacks or {}
+    outputs = OrderedDict()
+    validation = "run"
+    for index, task_key in enumerate(plan.stages):
+        if task_key == VALIDATION_TASK_KEY and PLANNING_VALIDATION_MODE == "auto":
+            if will_skip_validation(outputs['consolidar_em_prompt_task']):
+                validation = "skipped"
+                break
+            log_event("validation_required", problems=check_plan_structure(outputs['consolidar_em_prompt_task']))
+        if task_key == RESEARCH_TASK_KEY and RESEARCH_FANOUT_MODE == "parallel":
+            outputs[task_key] = run_research_fanout(user_message, verbose=verbose)
+            if task_key in task_callbacks:
+                task_callbacks[task_key](outputs[task_key])
+            continue
+        inputs = {'demanda_usuario': user_message}
+        if index > 0:
+            inputs['contexto'] = build_stage_context(task_key, user_message, outputs)
+        crew = create_stage_crew(task_key, agents, verbose=verbose, callback=task_callbacks.get(task_key), with_context=index > 0)
+        outputs[task_key] = str(crew.kickoff(inputs=inputs))
+
+    result = outputs[next(reversed(outputs))]
+    if validation == "skipped":
+        result = f"{result.strip()}\n\n{PLAN_AUTO_VALIDATED_FOOTER}"
+    usage = current_job_usage.get()
+    if usage is not None:
+        usage.planning_path = plan.path
+        usage.validation = validation
+    metrics.inc("planning_paths_total", path=plan.path, validation=validation)
+    log_event("planning_path", path=plan.path, reason=plan.reason, word_count=plan.word_count, keywords=plan.keywords,
+              list_items=plan.list_items, delegation=plan.allow_delegation, stages=list(outputs), validation=validation)
+    return result
+
+
+# --- CACHE EM MEMÓRIA DOS RESULTADOS DA CREW ---
+# Demandas praticamente idênticas (modelos encaminhados, reenvios após timeout) reaproveitam o
+# plano já gerado. O cache fica apenas em memória, mantendo a promessa de não gravar nada em disco.
+CREW_CACHE_TTL_SECONDS = float(os.getenv("CREW_CACHE_TTL_SECONDS", "3600"))
+CREW_CACHE_MAX_BYTES = int(os.getenv("CREW_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def normalize_demand(text: str) -> str:
+    """
+    Forma canônica da demanda: sem acentos, minúscula, sem pontuação e com espaços colapsados.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD_RE.sub(" ", without_accents.lower()).split())
+
+
+class CrewResultCache:
+    """
+    Cache LRU com TTL e orçamento em bytes para os resultados da Crew, indexado pela demanda
+    normalizada. Pedidos idênticos simultâneos aguardam a execução em andamento em vez de
+    iniciar outra Crew.
+    """
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self._ttl = ttl_seconds
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # chave -> (valor, expira_em, tamanho)
+        self._inflight = {}  # chave -> Future da execução em andamento
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0}
+
+    def get_or_compute(self, demand: str, compute):
+        key = normalize_demand(demand)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    print("DEBUG: Resultado da Crew encontrado no cache.")
+                    return entry[0]
+                self._remove(key)
+                self._stats["expirations"] += 1
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = concurrent.futures.Future()
+                self._inflight[key] = inflight
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            print("DEBUG: Demanda idêntica já em processamento. Aguardando o resultado em andamento.")
+            return inflight.result()
+
+        try:
+            value = compute()
+        except Exception as e:
+            # Falhas não são armazenadas; quem estava aguardando recebe o mesmo erro
+            with self._lock:
+                del self._inflight[key]
+            inflight.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            del self._inflight[key]
+        inflight.set_result(value)
+        return value
+
+    def _store(self, key: str, value: str):
+        size = len(key.encode("utf-8")) + len(value.encode("utf-8"))
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self._ttl, size)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self._max_bytes,
+                "inflight": len(self._inflight),
+                "hit_ratio": (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0,
+            })
+        return stats
+
+
+crew_result_cache = CrewResultCache(ttl_seconds=CREW_CACHE_TTL_SECONDS, max_bytes=CREW_CACHE_MAX_BYTES)
+
+
+# --- ENTREGA PROGRESSIVA DAS ETAPAS INTERMEDIÁRIAS DA CREW ---
+# Em vez de esperar as quatro tarefas terminarem, o usuário pode receber um aviso (ou um trecho
+# do resultado) a cada etapa concluída. PROGRESS_MODE:
+#   "off" (padrão) -> só a mensagem final
+#   "progress"     -> aviso curto a cada etapa
+#   "partial"      -> aviso + trecho da saída da etapa (resumo da pesquisa, rascunho, prompt consolidado)
+PROGRESS_MODE = os.getenv("PROGRESS_MODE", "off").lower()
+PROGRESS_MIN_INTERVAL_SECONDS = float(os.getenv("PROGRESS_MIN_INTERVAL_SECONDS", "30"))
+PROGRESS_EXCERPT_CHARS = int(os.getenv("PROGRESS_EXCERPT_CHARS", "700"))
+
+# Por etapa: (emoji, o que foi concluído, o que acontece quando ela é a próxima, título do trecho).
+# O aviso "Etapa i/n" é montado a partir das etapas do caminho escolhido (PipelinePlan.stages).
+PROGRESS_STAGE_MESSAGES = MappingProxyType({
+    'pesquisar_demanda_task': ("🔎", "terminamos a pesquisa sobre sua demanda", "Agora nossos especialistas estão pesquisando sua demanda.", "Resumo da pesquisa"),
+    MERGED_RESEARCH_TASK_KEY: ("💡", "pesquisa e conceito prontos, já temos um rascunho do projeto", "Agora nossos especialistas estão analisando sua demanda.", "Rascunho do conceito"),
+    'debater_e_conceituar_task': ("💡", "já temos um rascunho do conceito do projeto", "Agora nossos especialistas estão debatendo a melhor abordagem.", "Rascunho do conceito"),
+    'consolidar_em_prompt_task': ("📝", "o prompt técnico foi consolidado", "Estamos consolidando tudo em um prompt técnico.", "Prompt técnico consolidado (antes da validação)"),
+    VALIDATION_TASK_KEY: ("✅", "o prompt técnico foi validado", "Ele está passando pela validação final.", "Prompt técnico validado"),
+})
+
+
+class ProgressNotifier:
+    """
+    Envia ao usuário uma mensagem por etapa concluída da Crew, respeitando um intervalo mínimo
+    entre envios para não inundar o WhatsApp. A última etapa que vai rodar não gera aviso, pois o
+    resultado final já é enviado por send_crew_result_async; isso inclui a consolidação quando a
+    validação será dispensada (ver will_skip_validation).
+    """
+    def __init__(self, sender_number: str, stages=None, mode: str = PROGRESS_MODE, min_interval: float = PROGRESS_MIN_INTERVAL_SECONDS):
+        self.sender_number = sender_number
+        self.stages = tuple(stages) if stages is not None else PLANNING_PATHS['full']
+        self.mode = mode
+        self.min_interval = min_interval
+        self._last_sent_at = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("progress", "partial")
+
+    def task_callbacks(self) -> dict:
+        if not self.enabled:
+            return {}
+        return {
+            task_key: (lambda output, task_key=task_key: self.on_stage_done(task_key, output))
+            for task_key in self.stages[:-1]
+        }
+
+    def stage_message(self, task_key: str) -> str:
+        index = self.stages.index(task_key)
+        emoji, done_text, _, _ = PROGRESS_STAGE_MESSAGES[task_key]
+        next_text = PROGRESS_STAGE_MESSAGES[self.stages[index + 1]][2]
+        return f"{emoji} Etapa {index + 1}/{len(self.stages)} concluída: {done_text}. {next_text}"
+
+    def on_stage_done(self, task_key: str, output):
+        # Falhas no aviso nunca devem interromper a Crew
+        try:
+            raw = str(getattr(output, 'raw', output)).strip()
+            if self.stages[self.stages.index(task_key) + 1] == VALIDATION_TASK_KEY and will_skip_validation(raw):
+                # A consolidação é a última etapa: o próprio prompt já vai como resultado final
+                print(f"DEBUG: Aviso de progresso '{task_key}' omitido (validação dispensada).")
+                return
+            now = time.monotonic()
+            if self._last_sent_at is not None and now - self._last_sent_at < self.min_interval:
+                print(f"DEBUG: Aviso de progresso '{task_key}' suprimido (intervalo mínimo de {self.min_interval}s).")
+                return
+            status = self.stage_message(task_key)
+            excerpt_title = PROGRESS_STAGE_MESSAGES[task_key][3]
+            body = status
+            if self.mode == "partial":
+                if len(raw) > PROGRESS_EXCERPT_CHARS:
+                    raw = raw[:PROGRESS_EXCERPT_CHARS].rstrip() + "…"
+                if raw:
+                    body = f"{status}\n\n*{excerpt_title}:*\n{raw}"
+            if send_whatsapp_message(self.sender_number, body):
+                self._last_sent_at = now
+                print(f"DEBUG: Aviso de progresso '{task_key}' enfileirado para {self.sender_number}.")
+        except Exception as e:
+            print(f"❌ Erro ao enviar aviso de progresso para {self.sender_number}: {e}")
+
+
+app = Flask(__name__)
+
+# --- FUNÇÃO ASSÍNCRONA PARA PROCESSAR CREWAI E ENVIAR RESULTADO FINAL ---
+# Logs detalhados dos agentes (verbose) custam muito I/O de console; ficam desligados por padrão e
+# podem ser ligados para todos os jobs (CREW_VERBOSE=1) ou para uma amostra (CREW_VERBOSE_SAMPLE_RATE).
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "0") == "1"
+CREW_VERBOSE_SAMPLE_RATE = float(os.getenv("CREW_VERBOSE_SAMPLE_RATE", "0"))
+
+
+def send_crew_result_async(user_message: str, sender_number: str, verbose: bool = CREW_VERBOSE):
+    """
+    Executa o processo CrewAI em background e envia a mensagem final para o usuário.
+    """
+    print(f"DEBUG: Início do processamento CrewAI assíncrono para '{user_message}'")
+    usage = JobUsage()
+    current_job_usage.set(usage)
+    started = time.monotonic()
+    status = "ok"
+    try:
+        def run_crew() -> str:
+            plan = pipeline_planner.plan(user_message)
+            progress = ProgressNotifier(sender_number, plan.stages)
+            timer = CrewStageTimer(plan.stages)
+            timer.start()
+            return run_planning_pipeline(
+                user_message,
+                verbose=verbose,
+                task_callbacks=merge_task_callbacks(timer.task_callbacks(), progress.task_callbacks()),
+                plan=plan
+            )
+
+        resultado_do_prompt_tecnico = crew_result_cache.get_or_compute(user_message, run_crew)
+        final_message = resultado_do_prompt_tecnico
+        # Guarda o plano em memória para responder perguntas de acompanhamento sem nova Crew
+        session_store.save_plan(sender_number, user_message, final_message)
+        print(f"DEBUG: Resultado final do prompt técnico gerado para o usuário: \n{final_message}")
+
+    except Exception as crew_error:
+        status = "error"
+        print(f"❌ Erro ao executar a Crew de Brainstorming assíncrona: {crew_error}")
+        final_message = "Desculpe, nossa equipe de IA teve um problema ao gerar o plano do seu projeto. Por favor, tente novamente com uma descrição um pouco diferente, ou entre em contato com o suporte."
+    finally:
+        current_stage.set(None)
+
+    seconds = time.monotonic() - started
+    # Jobs servidos pelo cache não passam pelo pipeline e aparecem com path="cache"
+    path = usage.planning_path or "cache"
+    metrics.observe("crew_job_seconds", seconds, status=status, path=path)
+    metrics.inc("crew_jobs_total", status=status, path=path)
+    metrics.inc("crew_job_tokens_total", usage.prompt_tokens + usage.completion_tokens, path=path)
+    log_event("crew_job_done", status=status, seconds=round(seconds, 3), **usage.as_dict())
+
+    # Envia a mensagem final para o usuário usando o cliente Twilio
+    if send_whatsapp_message(sender_number, final_message):
+        print(f"DEBUG: Mensagem final do CrewAI enfileirada para envio a {sender_number}.")
+
+
+# --- MOTOR DE ENVIO ATIVO PELA TWILIO (DIVISÃO, RETENTATIVAS E LIMITE DE TAXA) ---
+# Todas as mensagens fora do TwiML (resultado da Crew, avisos de progresso, respostas de suporte
+# adiadas) passam por um único despachante. Ele divide textos acima do limite do WhatsApp em
+# partes ordenadas, respeita o limite de mensagens por segundo de cada número Twilio e refaz
+# envios que falharam por erros transitórios.
+TWILIO_MAX_MESSAGE_CHARS = int(os.getenv("TWILIO_MAX_MESSAGE_CHARS", "1600"))
+TWILIO_MESSAGES_PER_SECOND = float(os.getenv("TWILIO_MESSAGES_PER_SECOND", "1"))
+TWILIO_RATE_BURST = int(os.getenv("TWILIO_RATE_BURST", "3"))
+TWILIO_SEND_MAX_RETRIES = int(os.getenv("TWILIO_SEND_MAX_RETRIES", "4"))
+TWILIO_RETRY_BASE_SECONDS = float(os.getenv("TWILIO_RETRY_BASE_SECONDS", "1.0"))
+TWILIO_DISPATCHER_WORKERS = int(os.getenv("TWILIO_DISPATCHER_WORKERS", "2"))
+TWILIO_HTTP_TIMEOUT_SECONDS = float(os.getenv("TWILIO_HTTP_TIMEOUT_SECONDS", "15"))
+
+# Fronteiras preferidas para dividir Markdown, da mais forte para a mais fraca
+_SPLIT_BOUNDARIES = ("\n\n", "\n", ". ", "; ", ", ", " ")
+
+
+def split_message(text: str, limit: int = TWILIO_MAX_MESSAGE_CHARS) -> list:
+    """
+    Divide `text` em partes de no máximo `limit` caracteres (incluindo o prefixo "(i/n) "),
+    cortando preferencialmente entre parágrafos, depois linhas, frases e palavras.
+    """
+    text = text.strip()
+    if len(text) <= limit:
+        return [text]
+    # Reserva espaço para o prefixo de numeração, ex.: "(12/15) "
+    chunk_limit = limit - 10
+    parts = []
+    remaining = text
+    while len(remaining) > chunk_limit:
+        window = remaining[:chunk_limit]
+        cut = -1
+        for boundary in _SPLIT_BOUNDARIES:
+            idx = window.rfind(boundary)
+            # Evita partes minúsculas quando a única fronteira está logo no início
+            if idx >= chunk_limit // 3:
+                cut = idx + len(boundary)
+                break
+        if cut <= 0:
+            cut = chunk_limit
+        parts.append(remaining[:cut].rstrip())
+        remaining = remaining[cut:].lstrip()
+    if remaining:
+        parts.append(remaining)
+    total = len(parts)
+    return [f"({i}/{total}) {part}" for i, part in enumerate(parts, start=1)]
+
+
+class TokenBucket:
+    """
+    Balde de fichas thread-safe: `rate` fichas por segundo, acumulando até `capacity`.
+    `acquire` bloqueia até haver fichas suficientes e retorna quanto tempo esperou.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Quantos segundos faltam para haver `tokens` fichas, sem retirá-las.
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Retira as fichas se houver; senão retorna quantos segundos faltam (0.0 significa sucesso).
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        waited = 0.0
+        while True:
+            delay = self.try_acquire(tokens)
+            if delay == 0.0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+def is_transient_twilio_error(error: Exception) -> bool:
+    # Erros HTTP 429/5xx e falhas de rede são transitórios; 4xx (número inválido etc.) não
+    status = getattr(error, 'status', None)
+    if status is None:
+        return True
+    return status == 429 or status >= 500
+
+
+class OutboundMessage:
+    def __init__(self, to: str, body: str, delivery: concurrent.futures.Future, is_last_part: bool):
+        self.to = to
+        self.body = body
+        self.delivery = delivery
+        self.is_last_part = is_last_part
+        self.enqueued_at = time.monotonic()
+        self.job_id = current_job_id.get()
+
+
+class TwilioDeliveryEngine:
+    """
+    Despachante único de mensagens ativas. Cada destinatário é sempre atendido pela mesma thread,
+    o que preserva a ordem das partes de uma mensagem mesmo com vários jobs terminando juntos.
+    """
+    def __init__(self, num_workers: int, messages_per_second: float, burst: int, max_retries: int, retry_base_seconds: float):
+        self._queues = [queue.Queue() for _ in range(num_workers)]
+        self._messages_per_second = messages_per_second
+        self._burst = burst
+        self._max_retries = max_retries
+        self._retry_base_seconds = retry_base_seconds
+        self._buckets = {}  # número de origem -> TokenBucket
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stats = {"messages": 0, "parts_sent": 0, "parts_failed": 0, "retries": 0, "rate_limited_seconds": 0.0}
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i, outbox in enumerate(self._queues):
+                worker = threading.Thread(target=self._dispatch_loop, args=(outbox,), name=f"twilio-dispatcher-{i}")
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def send(self, to: str, body) -> concurrent.futures.Future:
+        """
+        Enfileira `body` (dividido em partes se necessário) para `to`. O Future resolve para
+        True quando todas as partes foram entregues, ou False se alguma falhou em definitivo.
+        """
+        self.start()
+        delivery = concurrent.futures.Future()
+        parts = split_message(str(body))
+        outbox = self._queues[hash(to) % len(self._queues)]
+        with self._lock:
+            self._stats["messages"] += 1
+            # Enfileira todas as partes juntas para que não se intercalem com outra mensagem ao mesmo destinatário
+            for i, part in enumerate(parts):
+                outbox.put(OutboundMessage(to, part, delivery, is_last_part=(i == len(parts) - 1)))
+        return delivery
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Espera as mensagens já enfileiradas serem enviadas (ou `timeout` segundos). Retorna True
+        se nada ficou pendente.
+        """
+        deadline = time.monotonic() + timeout
+        while any(outbox.unfinished_tasks for outbox in self._queues):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _bucket_for(self, from_number: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(from_number)
+            if bucket is None:
+                bucket = TokenBucket(self._messages_per_second, self._burst)
+                self._buckets[from_number] = bucket
+            return bucket
+
+    def _dispatch_loop(self, outbox: queue.Queue):
+        while True:
+            message = outbox.get()
+            try:
+                if message.delivery.done():
+                    # Uma parte anterior falhou em definitivo; descarta o restante da mensagem
+                    continue
+                current_job_id.set(message.job_id)
+                if self._send_with_retries(message) and message.is_last_part:
+                    message.delivery.set_result(True)
+            except Exception as e:
+                print(f"❌ Erro inesperado no despachante da Twilio: {e}")
+                if not message.delivery.done():
+                    message.delivery.set_result(False)
+            finally:
+                outbox.task_done()
+
+    def _send_with_retries(self, message: OutboundMessage) -> bool:
+        from_number = os.environ["TWILIO_PHONE_NUMBER"] # Seu número Twilio habilitado para WhatsApp
+        bucket = self._bucket_for(from_number)
+        for attempt in range(self._max_retries + 1):
+            waited = bucket.acquire()
+            started = time.monotonic()
+            try:
+                get_twilio_client().messages.create(
+                    from_=from_number,
+                    to=message.to,
+                    body=message.body
+                )
+                seconds = time.monotonic() - started
+                metrics.observe("twilio_send_seconds", seconds)
+                metrics.inc("twilio_sends_total", status="sent")
+                log_event("twilio_send", to=message.to, chars=len(message.body), attempt=attempt, seconds=round(seconds, 3),
+                          queued_seconds=round(started - message.enqueued_at, 3), status="sent")
+                with self._lock:
+                    self._stats["parts_sent"] += 1
+                    self._stats["rate_limited_seconds"] += waited
+                return True
+            except Exception as e:
+                metrics.observe("twilio_send_seconds", time.monotonic() - started)
+                metrics.inc("twilio_sends_total", status="error")
+                log_event("twilio_send", to=message.to, attempt=attempt, status="error", error=str(e))
+                if attempt < self._max_retries and is_transient_twilio_error(e):
+                    delay = self._retry_base_seconds * (2 ** attempt) * (0.5 + random.random())
+                    print(f"DEBUG: Falha transitória ao enviar para {message.to} ({e}). Nova tentativa em {delay:.1f}s.")
+                    with self._lock:
+                        self._stats["retries"] += 1
+                    time.sleep(delay)
+                    continue
+                print(f"❌ ERRO ao enviar mensagem para {message.to}: {e}")
+                with self._lock:
+                    self._stats["parts_failed"] += 1
+                message.delivery.set_result(False)
+                return False
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = sum(outbox.qsize() for outbox in self._queues)
+        stats["workers"] = len(self._queues)
+        return stats
+
+
+twilio_delivery = TwilioDeliveryEngine(
+    num_workers=TWILIO_DISPATCHER_WORKERS,
+    messages_per_second=TWILIO_MESSAGES_PER_SECOND,
+    burst=TWILIO_RATE_BURST,
+    max_retries=TWILIO_SEND_MAX_RETRIES,
+    retry_base_seconds=TWILIO_RETRY_BASE_SECONDS,
+)
+
+
+def send_whatsapp_message(sender_number: str, body) -> bool:
+    """
+    Envia uma mensagem ativa (fora da resposta TwiML do webhook) pelo motor de envio da Twilio.
+    Retorna True se a mensagem foi aceita para envio; a entrega ocorre em background.
+    """
+    try:
+        twilio_delivery.send(sender_number, body)
+        return True
+    except Exception as e:
+        print(f"❌ ERRO ao enfileirar mensagem para {sender_number}: {e}")
+        return False
+
+# --- GOVERNADOR DAS CHAMADAS AO GEMINI (CONCORRÊNCIA, COTA E PRIORIDADE) ---
+# Todas as chamadas ao LLM (etapas das Crews, suporte, acompanhamento) passam pelo mesmo
+# governador: um limite de chamadas simultâneas e baldes de requisições e de tokens por minuto
+# ajustados à cota do projeto no Gemini. Quando há fila, chamadas "interactive" (alguém esperando
+# no WhatsApp) passam na frente das "background" (etapas das Crews). Erros de limite de taxa
+# (429 / RESOURCE_EXHAUSTED) são repetidos com backoff exponencial com jitter. As Crews chegam aqui
+# pelo LLM de create_crew_llm, e create_stage_crew recusa agentes com qualquer outro LLM.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_RATE_LIMIT_MAX_RETRIES = int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "2.0"))
+# Tokens de saída presumidos ao reservar a cota de tokens (a saída real só é conhecida depois)
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+
+# Da maior para a menor prioridade
+LLM_PRIORITIES = ("interactive", "background")
+
+
+# Só o 429 como código de status (não qualquer número que contenha "429", ex. um ID ou contagem)
+RATE_LIMIT_MESSAGE_PATTERN = re.compile(
+    r"\b(?:status(?:[ _]code)?|code|http(?:/[\d.]+)?|error)\W{0,3}429\b|\btoo many requests\b|\bRESOURCE_EXHAUSTED\b",
+    re.IGNORECASE,
+)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # litellm levanta RateLimitError; outras camadas expõem o status HTTP 429 ou RESOURCE_EXHAUSTED
+    if "RateLimit" in type(error).__name__:
+        return True
+    response = getattr(error, "response", None)
+    for status in (getattr(error, "status_code", None), getattr(error, "code", None), getattr(response, "status_code", None)):
+        if status == 429:
+            return True
+    return bool(RATE_LIMIT_MESSAGE_PATTERN.search(str(error)))
+
+
+class LLMGovernor:
+    """
+    Controla a admissão das chamadas ao LLM. Cada chamada entra na fila da sua prioridade e só é
+    admitida quando é a primeira da maior prioridade com fila, há vaga de concorrência e os baldes
+    de requisições/tokens por minuto têm fichas. Limites <= 0 desligam o respectivo controle.
+    """
+    def __init__(self, max_concurrency: int, requests_per_minute: float, tokens_per_minute: float,
+                 max_retries: int, retry_base_seconds: float):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        # Baldes com capacidade de ~10s da cota, para não estourar a janela de um minuto de uma vez
+        self._buckets = []
+        if requests_per_minute > 0:
+            self._buckets.append(("requests", TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 6.0))))
+        if tokens_per_minute > 0:
+            self._buckets.append(("tokens", TokenBucket(tokens_per_minute / 60.0, max(1.0, tokens_per_minute / 6.0))))
+        self._waiting = {priority: deque() for priority in LLM_PRIORITIES}
+        self._active = 0
+        self._condition = threading.Condition()
+        self._stats = {"admitted": 0, "rate_limit_retries": 0, "rate_limit_failures": 0}
+
+    def _is_next(self, ticket, priority: str) -> bool:
+        for other in LLM_PRIORITIES:
+            if other == priority:
+                return self._waiting[priority][0] is ticket
+            if self._waiting[other]:
+                return False
+        return False
+
+    def acquire(self, priority: str = "background", estimated_tokens: int = 0) -> float:
+        """
+        Bloqueia até a chamada ser admitida e retorna quanto tempo ela esperou na fila.
+        """
+        ticket = object()
+        started = time.monotonic()
+        with self._condition:
+            self._waiting[priority].append(ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._is_next(ticket, priority) and (self.max_concurrency <= 0 or self._active < self.max_concurrency):
+                        needs = {"requests": 1, "tokens": estimated_tokens}
+                        timeout = max((bucket.wait_time(needs[name]) for name, bucket in self._buckets), default=0.0)
+                        if timeout == 0.0:
+                            for name, bucket in self._buckets:
+                                bucket.try_acquire(needs[name])
+                            break
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting[priority].remove(ticket)
+                # O próximo da fila pode ter passado a ser o primeiro
+                self._condition.notify_all()
+            self._active += 1
+            self._stats["admitted"] += 1
+        waited = time.monotonic() - started
+        metrics.observe("llm_governor_wait_seconds", waited, priority=priority)
+        return waited
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def call(self, fn, priority: str = "background", estimated_tokens: int = 0):
+        """
+        Executa `fn()` dentro do governador, repetindo erros de limite de taxa com backoff
+        exponencial e jitter ("full jitter"). A vaga é liberada durante a espera entre tentativas.
+        """
+        attempt = 0
+        while True:
+            self.acquire(priority, estimated_tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    if is_rate_limit_error(e):
+                        with self._condition:
+                            self._stats["rate_limit_failures"] += 1
+                    raise
+                delay = random.uniform(0, self.retry_base_seconds * (2 ** attempt))
+                attempt += 1
+                with self._condition:
+                    self._stats["rate_limit_retries"] += 1
+                metrics.inc("llm_rate_limit_retries_total", priority=priority)
+                log_event("llm_rate_limited", priority=priority, attempt=attempt, retry_in=round(delay, 3), error=str(e))
+            finally:
+                self.release()
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            stats["active"] = self._active
+            stats["max_concurrency"] = self.max_concurrency
+            for priority, waiting in self._waiting.items():
+                stats[f"waiting_{priority}"] = len(waiting)
+        return stats
+
+
+llm_governor = LLMGovernor(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_retries=LLM_RATE_LIMIT_MAX_RETRIES,
+    retry_base_seconds=LLM_RETRY_BASE_SECONDS,
+)
+
+
+# --- FILA DE JOBS CREWAI: POOL FIXO DE WORKERS E FILA LIMITADA (BACKPRESSURE) ---
+# Cada worker executa uma Crew completa contra o Gemini, então o número de workers
+# deve ser dimensionado de acordo com a cota da API, e não com o volume de mensagens.
+CREW_WORKERS = int(os.getenv("CREW_WORKERS", "2"))
+CREW_QUEUE_MAXSIZE = int(os.getenv("CREW_QUEUE_MAXSIZE", "20"))
+
+
+class CrewJob:
+    """
+    Um pedido de planejamento aguardando (ou em) processamento pela Crew.
+    """
+    def __init__(self, user_message: str, sender_number: str, job_id: str = None, verbose: bool = None, delay: float = 0.0):
+        self.job_id = job_id or new_job_id()
+        self.user_message = user_message
+        self.sender_number = sender_number
+        if verbose is None:
+            verbose = CREW_VERBOSE or random.random() < CREW_VERBOSE_SAMPLE_RATE
+        self.verbose = verbose
+        self.enqueued_at = time.monotonic()
+        # O job não começa antes deste instante (janela para o remetente completar a demanda)
+        self.not_before = self.enqueued_at + delay
+        self.cancelled = False
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def wait_time(self) -> float:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    @property
+    def run_time(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+
+class CrewJobQueue:
+    """
+    Fila em memória com tamanho máximo e um pool fixo de workers que executam `handler(job)`.
+    Quando a fila está cheia, `submit` recusa o job em vez de criar mais threads. Enquanto um job
+    não começou, ele pode ser complementado (`amend`) ou cancelado (`cancel`).
+    Jobs que ainda não podem começar (`not_before` no futuro) ficam num heap, fora da fila dos
+    workers; uma thread agendadora os passa para a fila quando vencem, então nenhum worker fica
+    parado esperando a janela de agrupamento. Eles contam para a capacidade, mas não para a posição
+    informada ao usuário.
+    """
+    def __init__(self, handler, num_workers: int, maxsize: int):
+        self._handler = handler
+        self._num_workers = num_workers
+        self._maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._due = threading.Condition(self._lock)
+        self._delayed = []  # heap de (not_before, seq, job)
+        self._delayed_seq = 0
+        self._scheduler = None
+        self._workers = []
+        self._running = 0
+        self.closed = False
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "amended": 0,
+            "cancelled": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "total_run_time": 0.0,
+            "max_run_time": 0.0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self._num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"crew-worker-{i}")
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+            self._scheduler = threading.Thread(target=self._scheduler_loop, name="crew-scheduler")
+            self._scheduler.daemon = True
+            self._scheduler.start()
+        print(f"DEBUG: Fila de jobs CrewAI iniciada com {self._num_workers} workers (capacidade {self._maxsize}).")
+
+    def submit(self, user_message: str, sender_number: str, job_id: str = None, delay: float = 0.0):
+        """
+        Enfileira um novo job, que só começa após `delay` segundos. Retorna `(job, posicao)` se
+        aceito, ou `(None, posicao)` se a fila estiver cheia, onde `posicao` é quantos pedidos
+        estão à frente do usuário.
+        """
+        job = CrewJob(user_message, sender_number, job_id=job_id, delay=delay)
+        with self._lock:
+            waiting = self._queue.qsize() + len(self._delayed)
+            # A posição informada ao usuário conta só os jobs já na fila ou rodando: os retidos
+            # ainda estão na janela de agrupamento e não ocupam nenhum worker
+            ahead = self._queue.qsize() + self._running
+            if self.closed:
+                self._stats["rejected"] += 1
+                print(f"DEBUG: Fila de jobs encerrada (desligamento). Job de {sender_number} recusado.")
+                return None, ahead + 1
+            if waiting >= self._maxsize:
+                self._stats["rejected"] += 1
+                print(f"DEBUG: Fila de jobs cheia ({waiting} aguardando). Job de {sender_number} recusado.")
+                return None, ahead + 1
+            if delay > 0:
+                self._hold(job)
+            else:
+                self._queue.put_nowait(job)
+            self._stats["submitted"] += 1
+        print(f"DEBUG: Job {job.job_id} enfileirado para {sender_number} ({ahead} à frente).")
+        return job, ahead + 1
+
+    def amend(self, job: CrewJob, user_message: str, delay: float = 0.0) -> bool:
+        """
+        Troca a demanda de um job que ainda não começou e adia o início por mais `delay` segundos.
+        Retorna False se o job já começou ou foi cancelado.
+        """
+        with self._lock:
+            if job.started_at is not None or job.cancelled:
+                return False
+            job.user_message = user_message
+            job.not_before = time.monotonic() + delay
+            self._stats["amended"] += 1
+        print(f"DEBUG: Job {job.job_id} complementado antes de começar.")
+        return True
+
+    def cancel(self, job: CrewJob) -> bool:
+        with self._lock:
+            if job.started_at is not None or job.cancelled:
+                return False
+            job.cancelled = True
+            self._stats["cancelled"] += 1
+            # Libera já a vaga que o job ocupava no heap (se ele já está na fila, o worker o descarta)
+            remaining = [entry for entry in self._delayed if entry[2] is not job]
+            if len(remaining) != len(self._delayed):
+                self._delayed = remaining
+                heapq.heapify(self._delayed)
+        print(f"DEBUG: Job {job.job_id} cancelado antes de começar.")
+        return True
+
+    def close(self):
+        """
+        Para de aceitar jobs novos; os que já estão na fila continuam sendo processados.
+        """
+        with self._lock:
+            self.closed = True
+            # Os jobs retidos no heap passam para a fila sem esperar a janela de agrupamento
+            self._due.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Espera os jobs enfileirados e em execução terminarem (ou `timeout` segundos). Depois de
+        `close`, os jobs não esperam mais a janela de agrupamento. Retorna True se nada ficou pendente.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pending = self._queue.unfinished_tasks + len(self._delayed)
+            if not pending:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+    def _hold(self, job: CrewJob):
+        # Chamado com self._lock: guarda o job no heap até `not_before`
+        heapq.heappush(self._delayed, (job.not_before, self._delayed_seq, job))
+        self._delayed_seq += 1
+        self._due.notify()
+
+    def _scheduler_loop(self):
+        # Passa para a fila dos workers os jobs retidos cujo `not_before` venceu. `amend` pode ter
+        # adiado um job depois que ele entrou no heap: nesse caso ele volta para o heap.
+        with self._lock:
+            while True:
+                if not self._delayed:
+                    self._due.wait()
+                    continue
+                not_before, _, job = self._delayed[0]
+                delay = not_before - time.monotonic()
+                if delay > 0 and not self.closed:
+                    self._due.wait(delay)
+                    continue
+                heapq.heappop(self._delayed)
+                if job.not_before > not_before and not self.closed:
+                    self._hold(job)
+                    continue
+                # Não enche: retidos + enfileirados nunca passam da capacidade
+                self._queue.put_nowait(job)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.cancelled:
+                    self._queue.task_done()
+                    continue
+                if job.not_before > time.monotonic() and not self.closed:
+                    # Complementado (`amend`) enquanto estava na fila: volta a esperar no heap
+                    self._hold(job)
+                    self._queue.task_done()
+                    continue
+                job.started_at = time.monotonic()
+                self._running += 1
+            metrics.observe("crew_job_wait_seconds", job.wait_time)
+            failed = False
+            try:
+                contextvars.Context().run(self._run_job, job)
+            except Exception as e:
+                failed = True
+                print(f"❌ Erro não tratado no job {job.job_id}: {e}")
+            finally:
+                job.finished_at = time.monotonic()
+                with self._lock:
+                    self._running -= 1
+                    self._stats["failed" if failed else "completed"] += 1
+                    self._stats["total_wait_time"] += job.wait_time
+                    self._stats["max_wait_time"] = max(self._stats["max_wait_time"], job.wait_time)
+                    self._stats["total_run_time"] += job.run_time
+                    self._stats["max_run_time"] = max(self._stats["max_run_time"], job.run_time)
+                self._queue.task_done()
+                metrics.observe("crew_job_run_seconds", job.run_time)
+                print(f"DEBUG: Job {job.job_id} finalizado (espera {job.wait_time:.1f}s, execução {job.run_time:.1f}s).")
+
+    def _run_job(self, job: CrewJob):
+        # Roda em um contexto novo para que o ID do job não vaze para o próximo job do worker
+        current_job_id.set(job.job_id)
+        self._handler(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            finished = stats["completed"] + stats["failed"]
+            stats.update({
+                "workers": self._num_workers,
+                "capacity": self._maxsize,
+                "queue_depth": self._queue.qsize() + len(self._delayed),
+                "delayed": len(self._delayed),
+                "running": self._running,
+                "avg_wait_time": stats["total_wait_time"] / finished if finished else 0.0,
+                "avg_run_time": stats["total_run_time"] / finished if finished else 0.0,
+            })
+        return stats
+
+
+crew_job_queue = CrewJobQueue(
+    handler=lambda job: send_crew_result_async(job.user_message, job.sender_number, verbose=job.verbose),
+    num_workers=CREW_WORKERS,
+    maxsize=CREW_QUEUE_MAXSIZE,
+)
+
+
+# --- IDEMPOTÊNCIA DO WEBHOOK E AGRUPAMENTO DE MENSAGENS FRACIONADAS ---
+# A Twilio reenvia o webhook quando respondemos devagar, e no WhatsApp é comum mandar a demanda
+# em várias mensagens seguidas. Sem tratamento, cada POST vira uma Crew completa. Aqui:
+#   - um MessageSid já tratado (dentro do TTL) não é roteado de novo: recebe a mesma resposta TwiML;
+#   - mensagens do mesmo remetente com menos de DEBOUNCE_WINDOW_SECONDS entre si são juntadas
+#     numa só demanda antes do roteamento, e o job ainda na fila é complementado em vez de
+#     duplicado. Todo job da Crew espera essa janela antes de começar
+#     (retido fora da fila dos workers, sem ocupar nenhum).
+MESSAGE_DEDUP_TTL_SECONDS = float(os.getenv("MESSAGE_DEDUP_TTL_SECONDS", "3600"))
+MESSAGE_DEDUP_MAX_ENTRIES = int(os.getenv("MESSAGE_DEDUP_MAX_ENTRIES", "10000"))
+# Quanto um reenvio espera pelo tratamento ainda em andamento do original (a Twilio desiste em 15s)
+MESSAGE_DEDUP_IN_FLIGHT_WAIT_SECONDS = float(os.getenv("MESSAGE_DEDUP_IN_FLIGHT_WAIT_SECONDS", "10"))
+DEBOUNCE_WINDOW_SECONDS = float(os.getenv("DEBOUNCE_WINDOW_SECONDS", "5"))
+DEBOUNCE_MAX_PARTS = int(os.getenv("DEBOUNCE_MAX_PARTS", "6"))
+
+
+class MessageDeduplicator:
+    """
+    MessageSids tratados nos últimos `ttl_seconds` (LRU por ordem de chegada), com a resposta TwiML
+    que cada um recebeu. Um reenvio recebe a mesma resposta, sem rotear de novo. O MessageSid só
+    fica registrado quando o tratamento termina com sucesso; enquanto ele está em andamento, um
+    reenvio espera por ele (até `in_flight_wait` segundos) em vez de tratá-lo em paralelo.
+    """
+    def __init__(self, ttl_seconds: float, max_entries: int, in_flight_wait: float = 10.0):
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._in_flight_wait = in_flight_wait
+        self._seen = OrderedDict()  # sid -> (instante, TwiML)
+        self._in_flight = {}  # sid -> threading.Event
+        self._lock = threading.Lock()
+        self._stats = {"unique": 0, "duplicates": 0, "evictions": 0, "abandoned": 0}
+
+    def claim(self, message_sid: str):
+        """
+        Retorna (True, None) se quem chamou deve tratar a mensagem (e depois chamar complete ou
+        abandon), ou (False, twiml) para um reenvio, com a resposta já dada (None se o tratamento
+        original ainda não terminou). Sem MessageSid, a mensagem é sempre tratada.
+        """
+        if not message_sid:
+            return True, None
+        deadline = time.monotonic() + self._in_flight_wait
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                while self._seen and next(iter(self._seen.values()))[0] < now - self._ttl:
+                    self._seen.popitem(last=False)
+                if message_sid in self._seen:
+                    self._stats["duplicates"] += 1
+                    return False, self._seen[message_sid][1]
+                done = self._in_flight.get(message_sid)
+                if done is None:
+                    self._in_flight[message_sid] = threading.Event()
+                    return True, None
+            remaining = deadline - now
+            if remaining <= 0 or not done.wait(remaining):
+                with self._lock:
+                    self._stats["duplicates"] += 1
+                return False, None
+
+    def complete(self, message_sid: str, twiml: str):
+        if not message_sid:
+            return
+        with self._lock:
+            self._seen[message_sid] = (time.monotonic(), twiml)
+            if len(self._seen) > self._max_entries:
+                self._seen.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._stats["unique"] += 1
+            done = self._in_flight.pop(message_sid, None)
+        if done is not None:
+            done.set()
+
+    def abandon(self, message_sid: str):
+        # O tratamento falhou: o próximo reenvio da Twilio será tratado do zero
+        if not message_sid:
+            return
+        with self._lock:
+            self._stats["abandoned"] += 1
+            done = self._in_flight.pop(message_sid, None)
+        if done is not None:
+            done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._seen)
+            stats["in_flight"] = len(self._in_flight)
+        return stats
+
+
+class MessageBurst:
+    """
+    Mensagens seguidas de um remetente, já juntadas, e o job da Crew criado a partir delas.
+    """
+    def __init__(self, text: str, job: CrewJob = None, parts: int = 1):
+        self.text = text
+        self.job = job
+        self.parts = parts
+        self.last_at = time.monotonic()
+
+
+class SenderDebouncer:
+    """
+    Guarda, por remetente, a rajada de mensagens ainda aberta (última mensagem há menos de
+    `window_seconds`). Só demandas (rotas "crew" e "clarify") abrem ou estendem uma rajada.
+    """
+    def __init__(self, window_seconds: float, max_parts: int):
+        self._window = window_seconds
+        self._max_parts = max_parts
+        self._bursts = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"joined": 0}
+
+    def _expire(self, now: float):
+        while self._bursts and next(iter(self._bursts.values())).last_at < now - self._window:
+            self._bursts.popitem(last=False)
+
+    def pending(self, sender_number: str):
+        """
+        Rajada aberta do remetente que ainda aceita mensagens, ou None.
+        """
+        if self._window <= 0:
+            return None
+        with self._lock:
+            self._expire(time.monotonic())
+            burst = self._bursts.get(sender_number)
+            return burst if burst is not None and burst.parts < self._max_parts else None
+
+    def remember(self, sender_number: str, text: str, job: CrewJob = None, parts: int = 1):
+        if self._window <= 0:
+            return
+        with self._lock:
+            self._bursts.pop(sender_number, None)
+            self._bursts[sender_number] = MessageBurst(text, job, parts)
+            if parts > 1:
+                self._stats["joined"] += 1
+
+    def forget(self, sender_number: str):
+        """
+        Encerra a rajada do remetente e retorna o job associado a ela (se houver).
+        """
+        with self._lock:
+            burst = self._bursts.pop(sender_number, None)
+        return burst.job if burst is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_bursts"] = len(self._bursts)
+        return stats
+
+
+message_deduplicator = MessageDeduplicator(
+    ttl_seconds=MESSAGE_DEDUP_TTL_SECONDS,
+    max_entries=MESSAGE_DEDUP_MAX_ENTRIES,
+    in_flight_wait=MESSAGE_DEDUP_IN_FLIGHT_WAIT_SECONDS,
+)
+sender_debouncer = SenderDebouncer(window_seconds=DEBOUNCE_WINDOW_SECONDS, max_parts=DEBOUNCE_MAX_PARTS)
+
+# --- RESPOSTAS DE SUPORTE VIA LLM SEM BLOQUEAR O WEBHOOK ---
+# Se o Gemini responder dentro do orçamento, a resposta vai direto no TwiML; caso contrário o
+# webhook confirma o recebimento e a resposta é enviada depois pelo cliente REST da Twilio.
+SUPPORT_INLINE_BUDGET_SECONDS = float(os.getenv("SUPPORT_INLINE_BUDGET_SECONDS", "2.0"))
+SUPPORT_WORKERS = int(os.getenv("SUPPORT_WORKERS", "4"))
+
+support_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SUPPORT_WORKERS, thread_name_prefix="support")
+
+SUPPORT_ERROR_MESSAGE = "Desculpe, não consegui gerar uma resposta para sua dúvida agora. Por favor, tente novamente em alguns instantes."
+
+
+def invoke_gemini(prompt: str, stage: str, priority: str = "interactive") -> str:
+    """
+    Chamada direta (fora da Crew) ao Gemini, pelo governador, com registro de tempo e tokens na
+    etapa `stage`. Por padrão é "interactive": há um usuário esperando a resposta.
+    """
+    current_stage.set(stage)
+
+    def timed_invoke():
+        started = time.perf_counter()
+        try:
+            response = get_gemini_llm().invoke(prompt)
+        except Exception as e:
+            record_llm_call("gemini/gemini-2.0-flash", time.perf_counter() - started, estimate_tokens(prompt), 0, error=e)
+            raise
+        usage = getattr(response, 'usage_metadata', None) or {}
+        answer = response.content if hasattr(response, 'content') else str(response)
+        record_llm_call(
+            "gemini/gemini-2.0-flash",
+            time.perf_counter() - started,
+            usage.get("input_tokens") or estimate_tokens(prompt),
+            usage.get("output_tokens") or estimate_tokens(answer),
+        )
+        return answer
+
+    return llm_governor.call(timed_invoke, priority=priority, estimated_tokens=estimate_tokens(prompt) + LLM_COMPLETION_TOKENS_ESTIMATE)
+
+
+def generate_support_answer(user_message: str) -> str:
+    return invoke_gemini(f"Como Assistente de Projetos com IA, o usuário perguntou: '{user_message}'. Responda de forma concisa e útil, oferecendo ajuda na execução, correção ou fornecendo recursos (links, documentação, tutoriais), se aplicável. O usuário está interagindo via WhatsApp, então a resposta deve ser direta e em português. Lembre-se que você é um consultor de execução de projetos.", stage="support")
+
+
+def send_deferred_support_answer(future: concurrent.futures.Future, sender_number: str):
+    """
+    Callback do Future de suporte: envia a resposta que estourou o orçamento de latência.
+    """
+    try:
+        answer = future.result()
+    except Exception as e:
+        print(f"❌ Erro ao gerar resposta de suporte para {sender_number}: {e}")
+        answer = SUPPORT_ERROR_MESSAGE
+    if send_whatsapp_message(sender_number, answer):
+        print(f"DEBUG: Resposta de suporte adiada enfileirada para envio a {sender_number}.")
+
+
+def respond_within_budget(generate, sender_number: str = None, ack_message: str = None) -> str:
+    """
+    Executa `generate()` em background. Retorna a própria resposta se ela ficar pronta dentro de
+    SUPPORT_INLINE_BUDGET_SECONDS, ou `ack_message` caso ela vá ser entregue depois pela Twilio.
+    Sem `sender_number` não há a quem entregar depois: estourado o orçamento, responde com
+    SUPPORT_ERROR_MESSAGE em vez de prender o webhook esperando o Gemini.
+    """
+    # Copia o contexto para que o ID do job acompanhe a chamada ao LLM e o envio adiado
+    future = support_executor.submit(contextvars.copy_context().run, generate)
+    budget = SUPPORT_INLINE_BUDGET_SECONDS
+    try:
+        answer = future.result(timeout=budget)
+        metrics.inc("support_answers_total", delivery="inline")
+        return answer
+    except concurrent.futures.TimeoutError:
+        if not sender_number:
+            print(f"DEBUG: Resposta de suporte excedeu {budget}s e não há remetente para o envio adiado.")
+            metrics.inc("support_answers_total", delivery="timeout")
+            return SUPPORT_ERROR_MESSAGE
+        print(f"DEBUG: Resposta de suporte excedeu {budget}s. Será enviada em seguida para {sender_number}.")
+        metrics.inc("support_answers_total", delivery="deferred")
+        context = contextvars.copy_context()
+        future.add_done_callback(lambda f: context.run(send_deferred_support_answer, f, sender_number))
+        return ack_message
+    except Exception as e:
+        print(f"❌ Erro ao gerar resposta de suporte: {e}")
+        return SUPPORT_ERROR_MESSAGE
+
+
+def answer_support_question(user_message: str, sender_number: str = None) -> str:
+    return respond_within_budget(
+        lambda: generate_support_answer(user_message),
+        sender_number,
+        "Recebi sua dúvida! 🔎 Estou preparando uma resposta e te envio em instantes."
+    )
+
+
+# --- SESSÕES DE CONVERSA EM MEMÓRIA ---
+# Guarda, por número de WhatsApp, o último plano validado e um histórico curto da conversa, para
+# que perguntas de acompanhamento sejam respondidas com uma única chamada ao LLM baseada no plano,
+# em vez de uma nova Crew completa. Tudo fica apenas em memória (nada em disco): as sessões expiram
+# por inatividade e as menos recentes são descartadas quando o limite global de memória é atingido.
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(4 * 1024 * 1024)))
+SESSION_PLAN_TOKEN_BUDGET = int(os.getenv("SESSION_PLAN_TOKEN_BUDGET", "3000"))
+SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "800"))
+
+
+class ConversationSession:
+    def __init__(self, demand: str, plan: str):
+        self.demand = demand
+        self.plan = plan
+        self.turns = deque()  # (papel, texto)
+        self.last_seen = time.monotonic()
+
+    def size_bytes(self) -> int:
+        return (len(self.demand.encode("utf-8")) + len(self.plan.encode("utf-8"))
+                + sum(len(text.encode("utf-8")) for _, text in self.turns))
+
+    def trim_history(self, token_budget: int):
+        while self.turns and sum(estimate_tokens(text) for _, text in self.turns) > token_budget:
+            self.turns.popleft()
+
+
+class SessionStore:
+    """
+    Sessões por remetente, em ordem de atividade (LRU), com TTL de inatividade e teto global em bytes.
+    """
+    def __init__(self, idle_ttl_seconds: float, max_bytes: int, plan_token_budget: int, history_token_budget: int):
+        self._idle_ttl = idle_ttl_seconds
+        self._max_bytes = max_bytes
+        self._plan_token_budget = plan_token_budget
+        self._history_token_budget = history_token_budget
+        self._sessions = OrderedDict()  # remetente -> ConversationSession
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"expired": 0, "evicted": 0}
+
+    def get(self, sender_number: str):
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(sender_number)
+            if session is not None:
+                session.last_seen = time.monotonic()
+                self._sessions.move_to_end(sender_number)
+            return session
+
+    def save_plan(self, sender_number: str, demand: str, plan: str):
+        with self._lock:
+            self._remove(sender_number)
+            session = ConversationSession(
+                truncate_to_tokens(demand, self._history_token_budget),
+                truncate_to_tokens(plan, self._plan_token_budget)
+            )
+            self._sessions[sender_number] = session
+            self._account(sender_number)
+
+    def add_exchange(self, sender_number: str, question: str, answer: str):
+        with self._lock:
+            session = self._sessions.get(sender_number)
+            if session is None:
+                return
+            session.turns.append(("Usuário", question))
+            session.turns.append(("Assistente", answer))
+            session.trim_history(self._history_token_budget)
+            session.last_seen = time.monotonic()
+            self._sessions.move_to_end(sender_number)
+            self._account(sender_number)
+
+    def clear(self, sender_number: str):
+        with self._lock:
+            self._remove(sender_number)
+
+    def _account(self, sender_number: str):
+        self._bytes -= self._sizes.get(sender_number, 0)
+        self._sizes[sender_number] = self._sessions[sender_number].size_bytes()
+        self._bytes += self._sizes[sender_number]
+        self._expire_idle()
+        while self._bytes > self._max_bytes and self._sessions:
+            self._remove(next(iter(self._sessions)))
+            self._stats["evicted"] += 1
+
+    def _expire_idle(self):
+        # As sessões estão em ordem de atividade, então as expiradas ficam no início
+        deadline = time.monotonic() - self._idle_ttl
+        while self._sessions:
+            sender_number, session = next(iter(self._sessions.items()))
+            if session.last_seen > deadline:
+                break
+            self._remove(sender_number)
+            self._stats["expired"] += 1
+
+    def _remove(self, sender_number: str):
+        if self._sessions.pop(sender_number, None) is not None:
+            self._bytes -= self._sizes.pop(sender_number)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"sessions": len(self._sessions), "bytes": self._bytes, "max_bytes": self._max_bytes})
+        return stats
+
+
+session_store = SessionStore(
+    idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    max_bytes=SESSION_MAX_BYTES,
+    plan_token_budget=SESSION_PLAN_TOKEN_BUDGET,
+    history_token_budget=SESSION_HISTORY_TOKEN_BUDGET,
+)
+
+
+def generate_follow_up_answer(user_message: str, sender_number: str) -> str:
+    session = session_store.get(sender_number)
+    if session is None:
+        # A sessão expirou entre o roteamento e a geração; responde como suporte comum
+        return generate_support_answer(user_message)
+    history = "\n".join(f"{role}: {text}" for role, text in list(session.turns))
+    prompt = (
+        "Como Assistente de Projetos com IA, você já entregou ao usuário o plano de projeto abaixo. "
+        "Responda à nova pergunta dele usando o plano como referência principal, de forma concisa e útil, "
+        "em português e direta para o WhatsApp. Se a pergunta pedir algo fora do plano, diga isso e ofereça ajuda.\n\n"
+        f"Demanda original: {session.demand}\n\n"
+        f"Plano validado:\n{session.plan}\n\n"
+        + (f"Conversa recente:\n{history}\n\n" if history else "")
+        + f"Nova pergunta do usuário: '{user_message}'"
+    )
+    answer = invoke_gemini(prompt, stage="follow_up")
+    session_store.add_exchange(sender_number, user_message, answer)
+    return answer
+
+
+def answer_follow_up_question(user_message: str, sender_number: str) -> str:
+    return respond_within_budget(
+        lambda: generate_follow_up_answer(user_message, sender_number),
+        sender_number,
+        "Recebi sua pergunta sobre o plano! 📋 Estou consultando o que já planejamos e te respondo em instantes."
+    )
+
+
+# --- ROTEADOR DE INTENÇÕES PRÉ-COMPILADO ---
+# A tabela de rotas fica em configuração e é compilada uma única vez: comandos exatos viram
+# conjuntos (busca O(1)) e as palavras-chave de suporte viram uma única expressão regular em
+# forma de trie, de modo que o custo por mensagem não cresce com o tamanho das listas.
+ROUTE_CONFIG = MappingProxyType({
+    # Mensagens com pelo menos este número de palavras são tratadas como demanda para a Crew
+    "crew_min_words": 15,
+    # Comandos exatos só são reconhecidos em mensagens com até este número de palavras
+    "exact_command_max_words": 3,
+    "greetings": ("ola", "olá", "oi", "bom dia", "boa tarde", "boa noite", "hi"),
+    "start_commands_exact": ("começar", "iniciar projeto", "novo projeto", "criar projeto"),
+    "help_commands_exact": ("ajuda", "suporte", "dúvida", "duvida"),
+    # Casam no início de palavra, ex.: "erro" também reconhece "erros"
+    "support_keywords": ("erro", "bug", "funciona", "problema no código", "executar", "link", "tutorial", "documentação", "corrigir", "implementar", "instalar"),
+    # Com um plano já entregue, indicam que uma pergunta se refere a ele (mensagens longas só viram
+    # acompanhamento se também terminarem em "?" e não tiverem sinal de projeto novo)
+    "follow_up_keywords": ("plano", "módulo", "modulo", "etapa", "fase", "requisito", "arquitetura", "tecnologia", "prompt", "como implementar", "como fazer", "por que", "explique", "detalhe"),
+    # Indicam uma demanda nova, mesmo com um plano já entregue
+    "new_project_keywords": (
+        "novo projeto", "nova ideia", "outro projeto", "outra ideia", "projeto diferente",
+        "novo sistema", "novo app", "novo aplicativo", "novo site", "novo bot", "nova plataforma",
+        "quero criar um", "quero criar uma", "quero desenvolver", "preciso de um", "preciso de uma", "gostaria de criar",
+    ),
+})
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    route: str  # "crew", "follow_up", "greeting", "start", "help", "support" ou "clarify"
+    reason: str
+    word_count: int
+    normalized: str
+
+
+def build_trie_pattern(words) -> str:
+    """
+    Monta uma expressão regular equivalente a `w1|w2|...`, mas fatorada como trie
+    (prefixos comuns compartilhados), o que mantém a busca rápida com centenas de palavras.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+class IntentRouter:
+    """
+    Decide, em uma única passada, para onde cada mensagem vai e por quê. A mensagem é
+    normalizada uma vez (sem acentos, minúscula, sem pontuação) e comparada com a tabela compilada.
+    """
+    def __init__(self, config=ROUTE_CONFIG):
+        self.crew_min_words = config["crew_min_words"]
+        self.exact_command_max_words = config["exact_command_max_words"]
+        self._greetings = frozenset(normalize_demand(cmd) for cmd in config["greetings"])
+        self._start_commands = frozenset(normalize_demand(cmd) for cmd in config["start_commands_exact"])
+        self._help_commands = frozenset(normalize_demand(cmd) for cmd in config["help_commands_exact"])
+        self._support_re = self._compile_keywords(config["support_keywords"])
+        self._follow_up_re = self._compile_keywords(config.get("follow_up_keywords", ()))
+        self._new_project_re = self._compile_keywords(config.get("new_project_keywords", ()))
+
+    @staticmethod
+    def _compile_keywords(keywords):
+        keywords = sorted({normalize_demand(kw) for kw in keywords})
+        return re.compile(r"\b" + build_trie_pattern(keywords)) if keywords else None
+
+    def route(self, user_message: str, has_plan: bool = False) -> RouteDecision:
+        """
+        `has_plan` indica que o remetente já recebeu um plano (sessão ativa), o que permite
+        responder perguntas de acompanhamento sem uma nova Crew.
+        """
+        normalized = normalize_demand(user_message)
+        word_count = len(user_message.split())
+        is_question = user_message.rstrip().endswith("?")
+        new_project = has_plan and self._new_project_re is not None and self._new_project_re.search(normalized) is not None
+        follow_up_match = self._follow_up_re.search(normalized) if has_plan and self._follow_up_re else None
+
+        if word_count >= self.crew_min_words:
+            # Descrições de projeto novo costumam citar tecnologia, arquitetura etc.; só é
+            # acompanhamento a pergunta que se refere ao plano e não traz sinal de demanda nova
+            if has_plan and is_question and follow_up_match and not new_project:
+                return RouteDecision("follow_up", f"plano ativo e pergunta sobre '{follow_up_match.group(0)}'", word_count, normalized)
+            reason = "com sinal de projeto novo" if new_project else f"(>= {self.crew_min_words})"
+            return RouteDecision("crew", f"{word_count} palavras {reason}", word_count, normalized)
+
+        # --- NÍVEL 1: SAUDAÇÕES MUITO CURTAS OU COMANDOS INICIAIS EXATOS ---
+        if word_count <= self.exact_command_max_words:
+            if normalized in self._help_commands:
+                return RouteDecision("help", f"comando de ajuda exato '{normalized}'", word_count, normalized)
+            if normalized in self._start_commands:
+                return RouteDecision("start", f"comando inicial exato '{normalized}'", word_count, normalized)
+            if normalized in self._greetings:
+                return RouteDecision("greeting", f"saudação exata '{normalized}'", word_count, normalized)
+
+        # Com um plano ativo, perguntas curtas ou mensagens que citam o plano são acompanhamento;
+        # o resto (ex.: "quero um app de receitas") segue o fluxo normal
+        if has_plan and (is_question or follow_up_match) and not new_project:
+            reason = f"palavra-chave de acompanhamento '{follow_up_match.group(0)}'" if follow_up_match else "pergunta curta"
+            return RouteDecision("follow_up", f"plano ativo e {reason}", word_count, normalized)
+
+        # --- NÍVEL 2: DISTINGUIR ENTRE SUPORTE ESPECÍFICO OU PEDIDO DE MAIS DETALHES ---
+        match = self._support_re.search(normalized) if self._support_re else None
+        if match:
+            return RouteDecision("support", f"palavra-chave de suporte '{match.group(0)}'", word_count, normalized)
+
+        return RouteDecision("clarify", f"ideia curta/ambígua ({word_count} palavras, sem palavra-chave)", word_count, normalized)
+
+
+intent_router = IntentRouter()
+
+
+def benchmark_intent_router(keywords_per_list: int = 500, iterations: int = 20000) -> dict:
+    """
+    Micro-benchmark do roteador: compara o custo por mensagem da tabela atual com uma tabela
+    inflada para `keywords_per_list` palavras-chave (vários idiomas) e com a varredura linear antiga.
+    Pode ser executado em uma célula separada: benchmark_intent_router().
+    """
+    sample_messages = [
+        "oi", "Bom dia!", "ajuda", "novo projeto",
+        "meu código dá erro ao instalar a biblioteca",
+        "como implementar o módulo de pagamentos?",
+        "quero um app de receitas",
+        "quero criar um aplicativo de delivery de comida com pagamento online e rastreamento em tempo real para minha cidade",
+    ]
+    base_terms = ["error", "fallo", "erreur", "fehler", "errore", "crash", "instalação", "instalación", "deploy", "falha"]
+    inflated_keywords = tuple(ROUTE_CONFIG["support_keywords"]) + tuple(
+        f"{base_terms[i % len(base_terms)]}{i}" for i in range(keywords_per_list)
+    )
+    inflated_config = dict(ROUTE_CONFIG)
+    inflated_config["support_keywords"] = inflated_keywords
+    inflated_config["greetings"] = tuple(ROUTE_CONFIG["greetings"]) + tuple(f"saudacao{i}" for i in range(keywords_per_list))
+
+    def legacy_route(user_message: str, keywords) -> str:
+        user_message_lower = user_message.lower().strip()
+        if len(user_message.split()) >= 15:
+            return "crew"
+        if any(kw in user_message_lower for kw in keywords):
+            return "support"
+        return "clarify"
+
+    def time_per_message(fn) -> float:
+        start = time.perf_counter()
+        for i in range(iterations):
+            fn(sample_messages[i % len(sample_messages)])
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    results = {
+        "router_default_us": time_per_message(IntentRouter().route),
+        "router_inflated_us": time_per_message(IntentRouter(inflated_config).route),
+        "legacy_default_us": time_per_message(lambda m: legacy_route(m, ROUTE_CONFIG["support_keywords"])),
+        "legacy_inflated_us": time_per_message(lambda m: legacy_route(m, inflated_keywords)),
+        "keywords_inflated": len(inflated_keywords),
+    }
+    for name, value in results.items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
+    return results
+
+
+# --- FUNÇÃO SÍNCRONA PARA RESPOSTAS IMEDIATAS (NÃO CREWAI) ---
+def get_immediate_response(user_message: str, sender_number: str = None, decision: RouteDecision = None) -> str:
+    """
+    Retorna a resposta imediata para mensagens que não exigem o processo CrewAI.
+    Perguntas de suporte podem ser respondidas depois via Twilio (ver answer_support_question).
+    """
+    decision = decision or intent_router.route(user_message)
+    started = time.monotonic()
+    try:
+        return _immediate_response_for(decision, user_message, sender_number)
+    finally:
+        seconds = time.monotonic() - started
+        metrics.observe("immediate_response_seconds", seconds, route=decision.route)
+        log_event("immediate_response", route=decision.route, seconds=round(seconds, 3))
+
+
+def _immediate_response_for(decision: RouteDecision, user_message: str, sender_number: str) -> str:
+    if decision.route == "help":
+        return (
+            "Claro! Sou seu Assistente de Projetos com IA. Por favor, me diga em que posso te ajudar com mais detalhes. "
+            "Seja para planejar um novo projeto, tirar uma dúvida sobre algo que já geramos, ou para resolver um problema técnico."
+        )
+    if decision.route in ("greeting", "start"):
+        return (
+            "Olá! Sou seu **Assistente de Projetos com IA**. Nossa equipe de especialistas está pronta para te ajudar a conceituar e planejar seu projeto.\n\n"
+            "**Como posso te ajudar hoje?** Por favor, me diga qual a sua ideia de projeto, o problema que você quer resolver, ou se precisa de suporte com algo específico."
+        )
+
+    if decision.route == "follow_up" and sender_number:
+        print(f"DEBUG: Pergunta de acompanhamento sobre o plano ativo ({decision.reason}). Respondendo com o plano como contexto.")
+        return answer_follow_up_question(user_message, sender_number)
+
+    if decision.route in ("support", "follow_up"):
+        print(f"DEBUG: Mensagem parece ser uma pergunta de suporte específica ({decision.reason}). Encaminhando para o LLM direto para resposta de suporte.")
+        return answer_support_question(user_message, sender_number)
+
+    # Se nenhuma das condições acima for atendida, é uma ideia de projeto curta/ambígua que precisa de mais detalhes
+    print(f"DEBUG: Mensagem parece ser uma ideia de projeto curta ou ambígua ({decision.reason}). Solicitando mais detalhes.")
+    return (
+        "Entendi sua ideia! Para que nossa equipe de especialistas possa criar um plano robusto, preciso de mais detalhes.\n\n"
+        "**Vamos lá detalhar o problema/ideia:** Por favor, me conte mais sobre:\n"
+        "**1. Qual o problema principal que seu projeto resolve ou a ideia central?**\n"
+        "**2. Quais os objetivos? O que ele deve fazer ou entregar?**\n"
+        "**3. Já pensou em alguma tecnologia (ex: Python, React, mobile)?**\n"
+        "**4. Há alguma restrição importante (prazo, orçamento, privacidade)?**\n\n"
+        "Quanto mais detalhes, melhor! Assim podemos criar um prompt técnico mais acertivo."
+    )
+
+
+# --- SERVIDOR DE PRODUÇÃO: ASSINATURA DA TWILIO, SAÚDE E DESLIGAMENTO GRACIOSO ---
+# SERVER_MODE escolhe como o app é servido quando o script é executado diretamente:
+#   "dev" (padrão)  -> servidor de desenvolvimento do Werkzeug + túnel ngrok, como no Colab
+#   "waitress"      -> servidor WSGI de produção (multithread), atrás do nosso load balancer
+# O módulo também pode ser servido por um servidor WSGI externo, ex.:
+#   gunicorn -w 1 --threads 16 --graceful-timeout 330 AssistenteDeProjetosAI_WhatsApp:app
+# Filas, cache, sessões e agrupamento de mensagens ficam em memória em cada processo: com mais
+# de um processo, o load balancer precisa fixar cada remetente (From) num mesmo processo.
+SERVER_MODE = os.getenv("SERVER_MODE", "dev").lower()
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", os.getenv("PORT", "5000")))
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "16"))
+USE_NGROK = os.getenv("USE_NGROK", "1" if SERVER_MODE == "dev" else "0") == "1"
+# Tempo máximo, no desligamento, esperando os jobs da Crew e os envios pendentes terminarem
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "300"))
+
+# Validação do cabeçalho X-Twilio-Signature (HMAC-SHA1 da URL + parâmetros com o Auth Token).
+# Atrás de proxy/load balancer, PUBLIC_BASE_URL deve ser a URL pública configurada na Twilio.
+# Ligada por padrão; só fica desligada por padrão no Colab e no modo "dev" executado
+# diretamente (o túnel do ngrok muda a URL assinada). Um servidor WSGI externo importa o
+# módulo (não passa pelo __main__), então sempre valida, a menos que TWILIO_VALIDATE_SIGNATURE=0.
+_SIGNATURE_OPTIONAL = RUNNING_IN_COLAB or (__name__ == "__main__" and SERVER_MODE == "dev")
+TWILIO_VALIDATE_SIGNATURE = os.getenv("TWILIO_VALIDATE_SIGNATURE", "0" if _SIGNATURE_OPTIONAL else "1") == "1"
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+if not TWILIO_VALIDATE_SIGNATURE:
+    if _SIGNATURE_OPTIONAL:
+        print("DEBUG: Validação da assinatura da Twilio desligada (Colab/modo dev).")
+    else:
+        print("❌ ATENÇÃO: TWILIO_VALIDATE_SIGNATURE=0 fora do Colab/modo dev: qualquer um pode chamar o webhook /whatsapp.")
+
+_twilio_signature_key = os.environ["TWILIO_AUTH_TOKEN"].encode("utf-8")
+
+
+def compute_twilio_signature(url: str, params) -> str:
+    """
+    Assinatura da Twilio: URL completa seguida de cada parâmetro POST (nome + valor), em ordem
+    alfabética de nome (e, num parâmetro repetido, cada valor distinto uma vez, em ordem, como o
+    RequestValidator da Twilio), assinada com HMAC-SHA1 e codificada em base64.
+    """
+    payload = url + "".join(name + value for name, values in sorted(params) for value in sorted(set(values)))
+    digest = hmac.new(_twilio_signature_key, payload.encode("utf-8"), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def is_valid_twilio_request() -> bool:
+    if not TWILIO_VALIDATE_SIGNATURE:
+        return True
+    signature = request.headers.get("X-Twilio-Signature", "")
+    if not signature:
+        return False
+    if PUBLIC_BASE_URL:
+        url = PUBLIC_BASE_URL + request.path + (f"?{request.query_string.decode()}" if request.query_string else "")
+    else:
+        url = request.url
+    expected = compute_twilio_signature(url, request.form.lists())
+    return hmac.compare_digest(expected, signature)
+
+
+_services_started = False
+_services_lock = threading.Lock()
+_draining = threading.Event()
+
+
+def start_background_services():
+    """
+    Sobe os workers da Crew e o despachante da Twilio no processo que atende as requisições.
+    Também roda antes da primeira requisição, para servidores WSGI que importam o módulo (e
+    fazem fork) sem passar pelo bloco __main__.
+    """
+    global _services_started
+    if _services_started:
+        return
+    with _services_lock:
+        if _services_started:
+            return
+        crew_job_queue.start()
+        twilio_delivery.start()
+        # Carrega CrewAI/LangChain/Twilio REST fora do caminho das respostas imediatas
+        threading.Thread(target=preload_heavy_modules, daemon=True).start()
+        atexit.register(drain_background_work)
+        _services_started = True
+
+
+app.before_request(start_background_services)
+
+
+def drain_background_work(timeout: float = DRAIN_TIMEOUT_SECONDS):
+    """
+    Desligamento gracioso: recusa jobs novos, espera os jobs em andamento e os envios pendentes
+    terminarem (até `timeout` segundos) em vez de matar as threads no meio de uma Crew.
+    """
+    if _draining.is_set():
+        return
+    _draining.set()
+    print(f"DEBUG: Desligando: aguardando jobs e envios pendentes (até {timeout:.0f}s)...")
+    started = time.monotonic()
+    deadline = started + timeout
+    crew_job_queue.close()
+    jobs_drained = crew_job_queue.drain(timeout)
+    deliveries_drained = twilio_delivery.drain(max(0.0, deadline - time.monotonic()))
+    stats = crew_job_queue.stats()
+    log_event("shutdown_drain", jobs_drained=jobs_drained, deliveries_drained=deliveries_drained,
+              pending_jobs=stats["queue_depth"] + stats["running"], seconds=round(time.monotonic() - started, 3))
+    if jobs_drained and deliveries_drained:
+        print("✅ Jobs e envios pendentes concluídos.")
+    else:
+        print(f"❌ Tempo de desligamento esgotado com {stats['queue_depth'] + stats['running']} jobs pendentes.")
+
+
+@app.route("/healthz", methods=['GET'])
+def healthz():
+    # Liveness: o processo está respondendo
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=['GET'])
+def readyz():
+    # Readiness: o load balancer só deve mandar tráfego se há workers, não estamos desligando e a fila aceita jobs
+    jobs = crew_job_queue.stats()
+    checks = {
+        "services_started": _services_started,
+        "not_draining": not _draining.is_set(),
+        "queue_accepting": jobs["queue_depth"] < jobs["capacity"],
+    }
+    ready = all(checks.values())
+    return jsonify({"status": "ready" if ready else "not_ready", **checks}), 200 if ready else 503
+
+
+@app.route("/whatsapp", methods=['POST'])
+def whatsapp_reply():
+    # Cada requisição roda em uma cópia do contexto (mantendo o contexto de requisição do Flask),
+    # com o ID que acompanhará toda a mensagem
+    return contextvars.copy_context().run(_handle_whatsapp_message)
+
+
+def _handle_whatsapp_message():
+    if not is_valid_twilio_request():
+        # Rejeita antes de qualquer trabalho (nem entra no controle de duplicatas)
+        metrics.inc("webhook_rejected_total", reason="signature")
+        log_event("webhook_rejected", reason="signature", remote_addr=request.remote_addr)
+        return "Assinatura da Twilio inválida.", 403
+    started = time.monotonic()
+    current_job_id.set(new_job_id())
+    incoming_msg = request.values.get('Body', '').strip()
+    sender_number = request.values.get('From', '').strip()
+    message_sid = request.values.get('MessageSid', '').strip()
+
+    claimed, replay = message_deduplicator.claim(message_sid)
+    if not claimed:
+        # Reenvio da Twilio de uma mensagem já tratada: repete a resposta dada, sem rotear de novo
+        print(f"DEBUG: Mensagem {message_sid} de {sender_number} já recebida; resposta anterior repetida.")
+        metrics.inc("webhook_duplicates_total")
+        log_event("webhook_duplicate", message_sid=message_sid, replayed=replay is not None)
+        return replay if replay is not None else str(MessagingResponse())
+
+    try:
+        twiml = _route_whatsapp_message(incoming_msg, sender_number, started)
+    except Exception:
+        message_deduplicator.abandon(message_sid)
+        raise
+    message_deduplicator.complete(message_sid, twiml)
+    return twiml
+
+
+def _route_whatsapp_message(incoming_msg: str, sender_number: str, started: float) -> str:
+    resp = MessagingResponse()
+    print(f"Mensagem recebida de {sender_number}: {incoming_msg}")
+
+    # Decide se a mensagem é um projeto detalhado que exige CrewAI (processo longo)
+    # ou uma mensagem que pode ser respondida imediatamente.
+    has_plan = session_store.get(sender_number) is not None
+    decision = intent_router.route(incoming_msg, has_plan=has_plan)
+
+    # Continuação de uma demanda enviada há poucos segundos: junta as partes e roteia o todo.
+    # Saudações e comandos valem sozinhos.
+    burst = sender_debouncer.pending(sender_number)
+    parts = 1
+    if burst is not None and decision.route not in ("greeting", "start", "help"):
+        incoming_msg = f"{burst.text}\n{incoming_msg}"
+        parts = burst.parts + 1
+        decision = intent_router.route(incoming_msg, has_plan=has_plan)
+        metrics.inc("messages_joined_total")
+        print(f"DEBUG: Mensagem juntada às {burst.parts} anteriores de {sender_number}.")
+    print(f"DEBUG: Rota '{decision.route}' escolhida: {decision.reason}.")
+
+    if decision.route == "start":
+        # O usuário quer começar do zero: descarta o plano anterior da memória e o pedido que
+        # ainda estava na fila
+        session_store.clear(sender_number)
+        abandoned_job = sender_debouncer.forget(sender_number)
+        if abandoned_job is not None:
+            crew_job_queue.cancel(abandoned_job)
+
+    if decision.route == "crew":
+        amended = burst is not None and burst.job is not None and crew_job_queue.amend(burst.job, incoming_msg, delay=DEBOUNCE_WINDOW_SECONDS)
+        if amended:
+            # O job da primeira parte ainda não começou: passa a usar a demanda completa
+            job, posicao = burst.job, None
+            log_event("crew_job_amended", amended_job_id=job.job_id, parts=parts)
+        else:
+            # Enfileira o job para o pool de workers; se a fila estiver cheia, avisa o usuário
+            job, posicao = crew_job_queue.submit(incoming_msg, sender_number, job_id=current_job_id.get(), delay=DEBOUNCE_WINDOW_SECONDS)
+        if job is not None:
+            sender_debouncer.remember(sender_number, incoming_msg, job, parts)
+        if amended:
+            resp.message("Recebi o complemento da sua demanda! 👍 Vamos incluí-lo na mesma análise, sem abrir um novo pedido.")
+        elif job is None and crew_job_queue.closed:
+            resp.message("Estamos reiniciando nosso serviço neste momento. 🔧 Por favor, envie sua demanda novamente em alguns minutos.")
+        elif job is None:
+            resp.message(f"Estamos com muitos pedidos no momento! 😅 Há {posicao - 1} projetos sendo analisados na sua frente e nossa fila está cheia. Por favor, envie sua demanda novamente em alguns minutos.")
+        elif posicao > CREW_WORKERS:
+            # Envia a mensagem de "Aguarde" imediatamente, indicando a posição na fila
+            resp.message(f"Aguarde um instante, por favor! Nossos especialistas de IA estão ocupados com outros projetos e sua demanda é a {posicao - CREW_WORKERS}ª da fila. Assim que chegar a sua vez, analisaremos e debateremos a melhor abordagem. Te avisaremos com o plano! 😊")
+        else:
+            # Envia a mensagem de "Aguarde" imediatamente
+            resp.message("Aguarde um instante, por favor! Nossos especialistas de IA estão analisando sua demanda e debatendo a melhor abordagem. Isso pode levar alguns minutos. Assim que tivermos uma resposta ou o plano inicial, te avisaremos! 😊")
+    else:
+        if decision.route == "clarify":
+            # Ideia curta: a próxima mensagem, se vier logo, provavelmente completa a demanda
+            sender_debouncer.remember(sender_number, incoming_msg, burst.job if burst is not None else None, parts)
+        elif decision.route != "start":
+            sender_debouncer.forget(sender_number)
+        # Para mensagens curtas/simples, obtém a resposta imediatamente e a envia
+        immediate_response = get_immediate_response(incoming_msg, sender_number, decision)
+        resp.message(immediate_response)
+
+    seconds = time.monotonic() - started
+    metrics.inc("webhook_requests_total", route=decision.route)
+    metrics.observe("webhook_seconds", seconds, route=decision.route)
+    log_event("webhook", route=decision.route, reason=decision.reason, words=decision.word_count, seconds=round(seconds, 4))
+    return str(resp)
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+metrics.register_collector("crew_queue", crew_job_queue.stats)
+metrics.register_collector("crew_cache", crew_result_cache.stats)
+metrics.register_collector("twilio_delivery", twilio_delivery.stats)
+metrics.register_collector("sessions", session_store.stats)
+metrics.register_collector("llm_governor", llm_governor.stats)
+metrics.register_collector("webhook_dedup", message_deduplicator.stats)
+metrics.register_collector("debounce", sender_debouncer.stats)
+
+
+@app.route("/jobs/stats", methods=['GET'])
+def jobs_stats():
+    # Profundidade da fila e tempos de espera/execução, para dimensionar CREW_WORKERS à cota do Gemini
+    return jsonify(crew_job_queue.stats())
+
+
+@app.route("/cache/stats", methods=['GET'])
+def cache_stats():
+    return jsonify(crew_result_cache.stats())
+
+
+@app.route("/delivery/stats", methods=['GET'])
+def delivery_stats():
+    return jsonify(twilio_delivery.stats())
+
+
+@app.route("/llm/stats", methods=['GET'])
+def llm_stats():
+    # Chamadas ativas, fila por prioridade e retentativas por limite de taxa do governador do Gemini
+    return jsonify(llm_governor.stats())
+
+# Função para rodar o servidor Flask em uma thread
+def run_flask_app_thread():
+    if SERVER_MODE == "waitress":
+        try:
+            from waitress import serve
+        except ImportError:
+            print("❌ SERVER_MODE=waitress requer o pacote 'waitress' (pip install waitress).")
+            raise
+        serve(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS)
+    else:
+        run_simple(SERVER_HOST, SERVER_PORT, app, use_reloader=False, use_debugger=False)
+
+# Função para iniciar ngrok e obter a URL pública
+def start_ngrok_tunnel(port):
+    print("Iniciando túnel Ngrok...")
+    try:
+        from pyngrok import ngrok
+        tunnel = ngrok.connect(port)
+        public_url = tunnel.public_url
+        print(f"🚀 Ngrok Tunnel URL: {public_url}")
+        return public_url
+    except Exception as e:
+        print(f"❌ Erro ao iniciar Ngrok: {e}")
+        print("Certifique-se de ter autenticado o Ngrok. Execute '!ngrok config add-authtoken SEU_TOKEN_NGROK' em uma célula separada.")
+        return None
+
+# --- PROMPT E AGENTES QUE "CONSTROEM" O PRÓPRIO BOT DE ASSISTÊNCIA DE PROJETOS (OPCIONAL) ---
+# Este relatório não é usado para atender mensagens, então ele não roda mais antes do servidor
+# subir. BOT_SELF_REPORT_MODE controla quando ele é gerado:
+#   "skip" (padrão)  -> não gera; chame get_bot_self_report() em uma célula separada se quiser o relatório
+#   "background"     -> gera em background depois que o servidor e o túnel estiverem no ar
+#   "startup"        -> comportamento antigo: gera (bloqueando) antes de subir o servidor
+BOT_SELF_REPORT_MODE = os.getenv("BOT_SELF_REPORT_MODE", "skip").lower()
+
+prompt_aprovado_bot = """
+O projeto a ser desenvolvido é um **"Assistente de Projetos com IA para Profissionais no WhatsApp"**. Este bot tem como objetivo principal ajudar profissionais a conceituar e planejar seus projetos de software ou IA, passando por um processo colaborativo e validado.
+
+**Fluxo de Interação do Bot com o Usuário (Capacidades Principais):**
+1.  **Brainstorming & Planejamento:** O bot recebe a descrição do projeto do usuário. Uma equipe interna de IA (CrewAI) composta por um *Pesquisador*, *Estrategista* e *Consolidor* debate e gera um "Prompt Técnico Validado" detalhado para o projeto do usuário.
+2.  **Validação Externa:** O "Prompt Técnico Validado" é então analisado por um *Validador Externo* que garante sua clareza, completude e alinhamento com a demanda original do usuário, antes de ser apresentado.
+3.  **Simulação de Execução:** O bot informa ao usuário que o "Prompt Técnico Validado" seria então entregue a uma "Equipe de Execução" (conceitual neste MVP) que desenvolveria back-end, front-end e faria a validação.
+4.  **Canal Aberto para Dúvidas e Suporte:** Após a entrega do prompt, o bot oferece suporte contínuo através de um agente especializado para tirar dúvidas, ajudar na execução local (se o código for gerado), corrigir erros e fornecer recursos (links, docs).
+
+**Requisitos Chave do Bot (como sistema):**
+1.  **Interface WhatsApp:** Receber e enviar mensagens via Twilio.
+2.  **Orquestração de IA:** Utilizar CrewAI para gerenciar a colaboração entre agentes para planejamento de projetos.
+3.  **Geração de Prompt Técnico:** A saída principal do bot deve ser um prompt técnico detalhado e validado para o projeto do usuário.
+4.  **Suporte Interativo:** Capacidade de responder a perguntas de acompanhamento sobre o plano ou execução.
+5.  **Privacidade Total:** Nenhuma mensagem ou dado do usuário será armazenado em disco. O processamento é em memória.
+
+**Tecnologias Esperadas para o Bot:** Python (Flask), Google Gemini API (via LiteLLM), CrewAI, Twilio WhatsApp API.
+"""
+
+
+def create_execution_crew_for_bot_itself(prompt_aprovado: str):
+    from crewai import Agent, Task, Crew, Process
+
+    # LLM instrumentado: as chamadas desta Crew também passam pelo governador, como "background"
+    llm = create_crew_llm()
+    engenheiro_requisitos = Agent(
+        role='Engenheiro de Requisitos de Software',
+        goal='Traduzir requisitos do projeto do bot em funcionalidades e especificações claras.',
+        backstory='Você é um engenheiro de requisitos experiente em transformar conceitos de bots de IA em especificações técnicas detalhadas.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+
+    arquiteto_software = Agent(
+        role='Arquiteto de Software e IA',
+        goal='Definir a arquitetura técnica do bot, suas interações com LLMs e APIs.',
+        backstory='Com anos de experiência em engenharia de software e IA, você estrutura soluções escaláveis e eficientes para bots conversacionais.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+
+    dev_backend = Agent(
+        role='Desenvolvedor Python Back-End do Bot',
+        goal='Desenvolver a lógica de comunicação, orquestração de Crews e integração com APIs da Twilio e Google Gemini.',
+        backstory='Você é um desenvolvedor Python focado na criação de APIs robustas e lógica de negócio para bots de IA.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+
+    dev_frontend = Agent(
+        role='Desenvolvedor Front-End de Interface de Teste',
+        goal='Criar interfaces de teste e mensagens iniciais amigáveis para o bot.',
+        backstory='Especialista em experiências digitais, você transforma funcionalidades em interfaces bonitas e intuitivas, e mensagens claras para o usuário.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+
+    qa_validador = Agent(
+        role='Validador QA do Bot',
+        goal='Validar se o bot atende aos requisitos de funcionalidade, privacidade e usabilidade.',
+        backstory='Você é um analista de qualidade com olhar atento para erros e inconsistências em bots de IA.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+    
+    suporte_usuario = Agent(
+        role='Documentador e Suporte de Conhecimento do Bot',
+        goal='Documentar as funcionalidades do bot e preparar guias de uso/solução de problemas internos.',
+        backstory='Você é essencial para garantir que o conhecimento sobre o bot esteja acessível e que ele possa ser mantido e aprimorado.',
+        llm=llm,
+        verbose=False,
+        allow_delegation=False
+    )
+
+    # Tarefas genéricas para desenvolvimento de software (agora descrevendo o bot em si)
+    analisar_requisitos_task = Task(
+        description='Analisar o prompt que define o "Assistente de Projetos com IA para WhatsApp" e extrair seus requisitos, funcionalidades e fluxo de interação.',
+        expected_output='Lista detalhada de requisitos e funcionalidades para o "Assistente de Projetos com IA para WhatsApp".',
+        agent=engenheiro_requisitos
+    )
+
+    desenhar_arquitetura_task = Task(
+        description='Propor a arquitetura do "Assistente de Projetos com IA para WhatsApp", incluindo tecnologias, camadas da aplicação e como a CrewAI se integrará com Twilio e Gemini.',
+        expected_output='Documento de arquitetura detalhado para o "Assistente de Projetos com IA para WhatsApp".',
+        agent=arquiteto_software
+    )
+
+    implementar_backend_task = Task(
+        description='Desenvolver o back-end do "Assistente de Projetos com IA para WhatsApp" conforme os requisitos e arquitetura definidos, focando na orquestração da CrewAI e na API do WhatsApp.',
+        expected_output='Código-fonte completo do back-end para o "Assistente de Projetos com IA para WhatsApp".',
+        agent=dev_backend
+    )
+
+    implementar_frontend_task = Task(
+        description='Criar as mensagens de boas-vindas e orientação para o "Assistente de Projetos com IA para WhatsApp" e definir uma interface de teste conceitual se aplicável.',
+        expected_output='Textos das mensagens de interação do bot e plano conceitual para interface de teste.',
+        agent=dev_frontend
+    )
+
+    validar_aplicacao_task = Task(
+        description='Testar o "Assistente de Projetos com IA para WhatsApp" para garantir que suas funcionalidades (brainstorming, validação, suporte) operem conforme o esperado e que a privacidade seja mantida.',
+        expected_output='Relatório de validação detalhado para o "Assistente de Projetos com IA para WhatsApp".',
+        agent=qa_validador
+    )
+
+    canal_duvidas_usuario_task_bot = Task(
+        description='Compilar FAQ e documentação interna para o uso e manutenção do "Assistente de Projetos com IA para WhatsApp".',
+        expected_output='Documentação interna e FAQ para o "Assistente de Projetos com IA para WhatsApp".',
+        agent=suporte_usuario
+    )
+
+    crew = Crew(
+        agents=[
+            engenheiro_requisitos,
+            arquiteto_software,
+            dev_backend,
+            dev_frontend,
+            qa_validador,
+            suporte_usuario
+        ],
+        tasks=[
+            analisar_requisitos_task,
+            desenhar_arquitetura_task,
+            implementar_backend_task,
+            implementar_frontend_task,
+            validar_aplicacao_task,
+            canal_duvidas_usuario_task_bot
+        ],
+        process=Process.sequential,
+        verbose=False,
+        manager_llm=llm,
+        llm=llm
+    )
+    print("\n--- Iniciando equipe de execução para 'construir' o próprio Bot Assistente de Projetos (processo inicial) ---")
+    return crew.kickoff(inputs={"prompt_aprovado": prompt_aprovado})
+
+
+_bot_self_report = None
+_bot_self_report_lock = threading.Lock()
+
+
+def get_bot_self_report() -> str:
+    """
+    Gera o relatório de desenvolvimento do próprio bot uma única vez por processo e o memoiza
+    (apenas em memória). Chamadas seguintes retornam o mesmo relatório sem novas chamadas ao Gemini.
+    """
+    global _bot_self_report
+    with _bot_self_report_lock:
+        if _bot_self_report is None:
+            _bot_self_report = str(create_execution_crew_for_bot_itself(prompt_aprovado=prompt_aprovado_bot))
+            print("\n✅ Relatório de desenvolvimento do Bot Assistente de Projetos:\n")
+            print(_bot_self_report)
+    return _bot_self_report
+
+
+def generate_bot_self_report_in_background():
+    try:
+        get_bot_self_report()
+    except Exception as e:
+        print(f"❌ Erro ao gerar o relatório de desenvolvimento do bot: {e}")
+
+
+if __name__ == "__main__":
+    if BOT_SELF_REPORT_MODE == "startup":
+        get_bot_self_report()
+
+    start_background_services()
+
+    # SIGTERM (orquestrador/contêiner) vira um Ctrl+C: interrompe a espera da thread principal,
+    # inclusive o input() do modo dev, e cai no desligamento gracioso do finally abaixo
+    def request_shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+
+    flask_thread = threading.Thread(target=run_flask_app_thread)
+    flask_thread.daemon = True
+    flask_thread.start()
+
+    if BOT_SELF_REPORT_MODE == "background":
+        threading.Thread(target=generate_bot_self_report_in_background, daemon=True).start()
+
+    time.sleep(1)
+
+    ngrok_url = None
+
+    try:
+        if USE_NGROK:
+            ngrok_url = start_ngrok_tunnel(SERVER_PORT)
+            public_url = ngrok_url
+        else:
+            public_url = PUBLIC_BASE_URL or f"http://{SERVER_HOST}:{SERVER_PORT}"
+
+        if public_url:
+            print(f"\n✨ Bot de Assistente de Projetos WhatsApp pronto em: {public_url}/whatsapp")
+            print("➡️ Configure este URL no seu Twilio WhatsApp Sandbox (Webhook 'WHEN A MESSAGE COMES IN').")
+            print("\n**Mensagem de Boas-Vindas e Orientações do Bot para o WhatsApp:**")
+            print("Olá! Sou seu Assistente de Projetos com IA. Nossa equipe de especialistas está pronta para ajudar a desenvolver o plano para seu projeto.")
+            print("Para começarmos, por favor, descreva em detalhes seu projeto ou problema. Inclua:")
+            print("1. A ideia principal / o que você quer criar.")
+            print("2. Os objetivos e o que o projeto deve fazer.")
+            print("3. Se há alguma tecnologia ou plataforma específica em mente.")
+            print("4. Quaisquer restrições ou requisitos importantes (ex: prazo, orçamento, privacidade).")
+            print("\nQuando estiver pronto, envie 'iniciar projeto' ou comece direto com a descrição do seu problema/projeto. Se tiver dúvidas *depois* que o plano for gerado, pode perguntar diretamente!")
+            print("\n---")
+            if SERVER_MODE == "dev":
+                print("Pressione Enter para encerrar o túnel Ngrok e o servidor Flask.")
+                input()
+            else:
+                print("Servidor em execução. Envie SIGTERM (ou Ctrl+C) para um desligamento gracioso.")
+                while flask_thread.is_alive():
+                    flask_thread.join(1)
+        else:
+            print("Não foi possível obter o URL do Ngrok. Verifique os logs acima para erros.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Espera as Crews em andamento e os envios pendentes antes de encerrar
+        drain_background_work()
+        if ngrok_url:
+            from pyngrok import ngrok
+            ngrok.kill()
+            print("Túnel Ngrok e servidor Flask encerrados.")
+        elif USE_NGROK:
+            print("Ngrok não foi iniciado, então não há túnel para encerrar.")
+
+    print("\nProcesso concluído. O bot está offline.")
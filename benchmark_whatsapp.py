@@ -0,0 +1,576 @@
+# Benchmark / teste de carga offline do Assistente de Projetos AI para WhatsApp
+#
+# Roda o `app` Flask do bot no próprio processo, com um LLM falso (latência e número de tokens
+# configuráveis) no lugar do Gemini, uma CrewAI falsa que executa as tarefas em sequência chamando
+# esse LLM, e um "sink" no lugar do cliente Twilio que apenas registra os envios. Nenhuma chamada
+# de rede é feita: basta `pip install flask twilio` em uma máquina Linux comum.
+#
+# Exemplos:
+#   python benchmark_whatsapp.py --rate 20 --requests 400
+#   python benchmark_whatsapp.py --rate 5 --requests 100 --llm-latency-ms 800 --env CREW_WORKERS=4
+#   python benchmark_whatsapp.py --replay trafego.jsonl --json
+#   python benchmark_whatsapp.py --router
+#
+# O arquivo de replay tem um JSON por linha: {"t": segundos_desde_o_inicio, "Body": "...", "From": "whatsapp:+55..."}
+# ("t" e "From" são opcionais).
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AssistenteDeProjetosAI_WhatsApp.py")
+
+FAKE_SECRETS = {
+    "GOOGLE_API_KEY": "fake-google-api-key",
+    "TWILIO_ACCOUNT_SID": "ACfakefakefakefakefakefakefakefake",
+    "TWILIO_AUTH_TOKEN": "fake-twilio-auth-token",
+    "TWILIO_PHONE_NUMBER": "whatsapp:+15550000000",
+}
+
+GREETINGS = ["oi", "Olá!", "bom dia", "ajuda", "novo projeto", "boa noite"]
+SUPPORT_QUESTIONS = [
+    "meu código dá erro ao instalar a biblioteca",
+    "como corrigir o bug no login?",
+    "o deploy não funciona no servidor",
+    "tem algum tutorial para executar o projeto?",
+]
+SHORT_IDEAS = ["quero um app de receitas", "um bot para minha loja", "sistema de agendamento"]
+LONG_DEMANDS = [
+    "quero criar um aplicativo de delivery de comida com pagamento online, rastreamento em tempo real do entregador e avaliação dos restaurantes para minha cidade",
+    "preciso de um sistema web para uma clínica gerenciar agendamentos de consultas, prontuário eletrônico, lembretes por WhatsApp e relatórios financeiros mensais",
+    "gostaria de um modelo de IA que classifique tickets de suporte por prioridade e assunto, integrado ao nosso helpdesk e com painel de métricas para os gestores",
+]
+
+
+# --- BACKENDS FALSOS ---
+class RateLimitError(Exception):
+    """
+    Mesmo nome da exceção do litellm, para exercitar as retentativas do governador do LLM.
+    """
+
+
+class FakeLLMProfile:
+    """
+    Distribuições usadas pelo LLM falso: latência log-normal (mediana e sigma) e tokens de saída normais.
+    """
+    def __init__(self, latency_ms: float, latency_sigma: float, tokens_mean: float, tokens_std: float, tokens_per_second: float):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_mean = tokens_mean
+        self.tokens_std = tokens_std
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit_ratio = 0.0
+        self.calls = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, max_tokens: int = None):
+        if self.rate_limit_ratio and random.random() < self.rate_limit_ratio:
+            with self._lock:
+                self.rate_limited += 1
+            raise RateLimitError("429 RESOURCE_EXHAUSTED: quota exceeded (falso)")
+        completion_tokens = max(1, int(random.gauss(self.tokens_mean, self.tokens_std)))
+        if max_tokens:
+            completion_tokens = min(completion_tokens, max_tokens)
+        prompt_tokens = max(1, len(str(prompt)) // 4)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        latency = random.lognormvariate(math.log(self.latency_ms / 1000.0), self.latency_sigma)
+        if self.tokens_per_second > 0:
+            latency += completion_tokens / self.tokens_per_second
+        time.sleep(latency)
+        text = "## Plano\n" + " ".join(f"token{i}" for i in range(completion_tokens))
+        return text, prompt_tokens, completion_tokens
+
+
+LLM_PROFILE = FakeLLMProfile(latency_ms=300, latency_sigma=0.4, tokens_mean=400, tokens_std=120, tokens_per_second=0)
+
+
+class FakeTwilioSink:
+    """
+    Substitui o cliente REST da Twilio: registra cada `messages.create` com o horário do envio.
+    """
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.sent = []
+        self._lock = threading.Lock()
+        self.messages = self
+
+    def create(self, from_=None, to=None, body=None, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        with self._lock:
+            self.sent.append({"at": time.monotonic(), "from": from_, "to": to, "body": body})
+        return types.SimpleNamespace(sid="SM" + uuid.uuid4().hex)
+
+    def last_send_by_recipient(self) -> dict:
+        with self._lock:
+            last = {}
+            for message in self.sent:
+                last[message["to"]] = message["at"]
+            return last
+
+
+def install_fake_modules():
+    """
+    Registra em `sys.modules` substitutos para google.colab, langchain_community, crewai e pyngrok.
+    """
+    colab = types.ModuleType("google.colab")
+    colab.userdata = types.SimpleNamespace(get=FAKE_SECRETS.get)
+    google = sys.modules.setdefault("google", types.ModuleType("google"))
+    google.colab = colab
+    sys.modules["google.colab"] = colab
+
+    chat_models = types.ModuleType("langchain_community.chat_models")
+
+    class ChatLiteLLM:
+        def __init__(self, model=None, api_key=None, temperature=None, **kwargs):
+            self.model = model
+            self.temperature = temperature
+
+        def invoke(self, prompt):
+            text, prompt_tokens, completion_tokens = LLM_PROFILE.generate(prompt)
+            return types.SimpleNamespace(
+                content=text,
+                usage_metadata={"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            )
+
+    chat_models.ChatLiteLLM = ChatLiteLLM
+    langchain_community = types.ModuleType("langchain_community")
+    langchain_community.chat_models = chat_models
+    sys.modules["langchain_community"] = langchain_community
+    sys.modules["langchain_community.chat_models"] = chat_models
+
+    crewai = types.ModuleType("crewai")
+
+    class LLM:
+        # Como na CrewAI 1.x: "gemini/..." vira a classe nativa do provedor, a menos que
+        # is_litellm=True ou a subclasse não tenha provedor nativo
+        def __new__(cls, model=None, is_litellm=False, **kwargs):
+            native_class = cls._get_native_provider(model.partition("/")[0])
+            if native_class is not None and not is_litellm:
+                return native_class(model=model, **kwargs)
+            return object.__new__(cls)
+
+        @classmethod
+        def _get_native_provider(cls, provider):
+            return GeminiCompletion if provider == "gemini" else None
+
+        def __init__(self, model=None, temperature=None, max_tokens=None, **kwargs):
+            self.model = model
+            self.temperature = temperature
+            self.max_tokens = max_tokens
+
+        def call(self, messages, *args, **kwargs):
+            text, _, _ = LLM_PROFILE.generate(messages, max_tokens=self.max_tokens)
+            return text
+
+    class GeminiCompletion(LLM):
+        def __new__(cls, *args, **kwargs):
+            return object.__new__(cls)
+
+    class Agent:
+        def __init__(self, role=None, goal=None, backstory=None, llm=None, verbose=False, allow_delegation=False, **kwargs):
+            self.role = role
+            self.goal = goal
+            self.backstory = backstory
+            self.llm = llm
+            self.verbose = verbose
+            self.allow_delegation = allow_delegation
+
+        def run(self, prompt: str):
+            if hasattr(self.llm, "call"):
+                return self.llm.call([{"role": "user", "content": prompt}])
+            response = self.llm.invoke(prompt)
+            return getattr(response, "content", str(response))
+
+    class TaskOutput:
+        def __init__(self, raw: str, agent: str):
+            self.raw = raw
+            self.agent = agent
+
+        def __str__(self):
+            return self.raw
+
+    class Task:
+        def __init__(self, description=None, expected_output=None, agent=None, callback=None, context=None, **kwargs):
+            self.description = description
+            self.expected_output = expected_output
+            self.agent = agent
+            self.callback = callback
+            self.context = context
+            self.output = None
+
+    class CrewOutput:
+        def __init__(self, raw: str, tasks_output: list):
+            self.raw = raw
+            self.tasks_output = tasks_output
+
+        def __str__(self):
+            return self.raw
+
+    class Crew:
+        def __init__(self, agents=None, tasks=None, process=None, verbose=False, **kwargs):
+            self.agents = agents or []
+            self.tasks = tasks or []
+            self.process = process
+            self.verbose = verbose
+            self.usage_metrics = None
+
+        def kickoff(self, inputs=None):
+            outputs = []
+            for task in self.tasks:
+                description = task.description.format_map(_SafeFormatDict(inputs or {}))
+                context = "\n\n".join(output.raw for output in outputs)
+                raw = task.agent.run(f"{description}\n\n{context}")
+                task.output = TaskOutput(raw, task.agent.role)
+                outputs.append(task.output)
+                if task.callback:
+                    task.callback(task.output)
+            return CrewOutput(outputs[-1].raw if outputs else "", outputs)
+
+    crewai.LLM = LLM
+    crewai.Agent = Agent
+    crewai.Task = Task
+    crewai.Crew = Crew
+    crewai.Process = types.SimpleNamespace(sequential="sequential", hierarchical="hierarchical")
+    sys.modules["crewai"] = crewai
+
+    pyngrok = types.ModuleType("pyngrok")
+    pyngrok.ngrok = types.SimpleNamespace(connect=lambda *a, **k: None, kill=lambda: None)
+    sys.modules["pyngrok"] = pyngrok
+    sys.modules["pyngrok.ngrok"] = pyngrok.ngrok
+
+
+class _SafeFormatDict(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def load_bot(twilio_sink: FakeTwilioSink, quiet: bool = True):
+    """
+    Executa o script do bot como módulo (sem o bloco __main__ e sem instalar dependências).
+    """
+    install_fake_modules()
+    os.environ.setdefault("SKIP_PIP_INSTALL", "1")
+    with open(BOT_SCRIPT, encoding="utf-8") as f:
+        source = f.read()
+    bot = types.ModuleType("assistente_whatsapp")
+    bot.__file__ = BOT_SCRIPT
+    sys.modules[bot.__name__] = bot
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        exec(compile(source, BOT_SCRIPT, "exec"), bot.__dict__)
+    bot._twilio_client = twilio_sink
+    return bot
+
+
+# --- TRÁFEGO ---
+def synthetic_traffic(num_requests: int, rate: float, mix: dict, duplicate_ratio: float,
+                      split_ratio: float = 0.0, redelivery_ratio: float = 0.0) -> list:
+    """
+    Tráfego sintético. Com `split_ratio`, parte das demandas longas chega em 2-3 mensagens seguidas
+    do mesmo remetente; com `redelivery_ratio`, parte das requisições é reenviada com o mesmo
+    MessageSid, como faz a Twilio quando o webhook demora.
+    """
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    traffic = []
+    for i in range(num_requests):
+        kind = random.choices(kinds, weights)[0]
+        if kind == "greeting":
+            body = random.choice(GREETINGS)
+        elif kind == "support":
+            body = random.choice(SUPPORT_QUESTIONS)
+        elif kind == "idea":
+            body = random.choice(SHORT_IDEAS)
+        else:
+            body = random.choice(LONG_DEMANDS)
+            if random.random() >= duplicate_ratio:
+                # Demandas distintas para não medir apenas acertos de cache
+                body = f"{body} (referência {uuid.uuid4().hex[:8]})"
+        sender = f"whatsapp:+5511{i:08d}"
+        bodies = [body]
+        if kind == "crew" and random.random() < split_ratio:
+            words = body.split()
+            cuts = sorted(random.sample(range(1, len(words)), random.randint(1, 2)))
+            bodies = [" ".join(words[a:b]) for a, b in zip([0] + cuts, cuts + [len(words)])]
+        for part, part_body in enumerate(bodies):
+            entry = {"t": i / rate + 0.4 * part, "Body": part_body, "From": sender, "kind": kind, "MessageSid": "SM" + uuid.uuid4().hex}
+            traffic.append(entry)
+            if random.random() < redelivery_ratio:
+                traffic.append(dict(entry, t=entry["t"] + 1.0, kind="redelivery"))
+    traffic.sort(key=lambda entry: entry["t"])
+    return traffic
+
+
+def replay_traffic(path: str, rate: float) -> list:
+    traffic = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            entry.setdefault("t", i / rate)
+            entry.setdefault("From", f"whatsapp:+5511{i:08d}")
+            entry.setdefault("kind", "replay")
+            traffic.append(entry)
+    return traffic
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def wait_until_idle(bot, timeout: float):
+    """
+    Espera a fila de jobs e o motor de envio esvaziarem (ou o tempo limite estourar).
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = bot.crew_job_queue.stats()
+        delivery = bot.twilio_delivery.stats()
+        if jobs["queue_depth"] == 0 and jobs["running"] == 0 and delivery["queue_depth"] == 0:
+            # Pequena folga para a última parte em voo ser registrada pelo sink
+            time.sleep(0.2)
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run_load_test(bot, sink: FakeTwilioSink, traffic: list, concurrency: int, drain_timeout: float) -> dict:
+    bot.crew_job_queue.start()
+    bot.twilio_delivery.start()
+
+    webhook_latency = {}
+    posted_at = {}
+    errors = []
+    peak_threads = [threading.active_count()]
+    stop_sampling = threading.Event()
+    lock = threading.Lock()
+    local = threading.local()
+
+    def sample_threads():
+        while not stop_sampling.is_set():
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            time.sleep(0.02)
+
+    def post(entry: dict, start: float):
+        delay = start + entry["t"] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if not hasattr(local, "client"):
+            local.client = bot.app.test_client()
+        data = {"Body": entry["Body"], "From": entry["From"], "MessageSid": entry.get("MessageSid", "SM" + uuid.uuid4().hex)}
+        # Assina como a Twilio, para medir também a validação (TWILIO_VALIDATE_SIGNATURE=1)
+        signature = bot.compute_twilio_signature("http://localhost/whatsapp", [(k, [v]) for k, v in data.items()])
+        sent_at = time.monotonic()
+        try:
+            response = local.client.post("/whatsapp", data=data, headers={"X-Twilio-Signature": signature})
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.monotonic() - sent_at
+        with lock:
+            webhook_latency.setdefault(entry["kind"], []).append(elapsed)
+            if entry["kind"] != "redelivery":
+                posted_at[entry["From"]] = (sent_at, entry["kind"])
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for entry in traffic:
+            pool.submit(post, entry, start)
+    send_window = time.monotonic() - start
+    idle = wait_until_idle(bot, drain_timeout)
+    total_time = time.monotonic() - start
+    stop_sampling.set()
+    sampler.join()
+
+    # Latência ponta a ponta: do POST até o último envio registrado para aquele remetente
+    last_send = sink.last_send_by_recipient()
+    end_to_end = {}
+    for sender, (sent_at, kind) in posted_at.items():
+        if sender in last_send and last_send[sender] >= sent_at:
+            end_to_end.setdefault(kind, []).append(last_send[sender] - sent_at)
+
+    all_webhook = [v for values in webhook_latency.values() for v in values]
+    crew_e2e = end_to_end.get("crew", []) + end_to_end.get("replay", [])
+    return {
+        "requests": len(traffic),
+        "errors": len(errors),
+        "drained": idle,
+        "send_window_s": round(send_window, 3),
+        "total_time_s": round(total_time, 3),
+        "throughput_rps": round(len(all_webhook) / send_window, 2) if send_window else 0.0,
+        "crews_completed_per_s": round(len(crew_e2e) / total_time, 3) if total_time else 0.0,
+        "webhook": summarize(all_webhook),
+        "webhook_by_kind": {kind: summarize(values) for kind, values in sorted(webhook_latency.items())},
+        "end_to_end_crew": summarize(crew_e2e),
+        "end_to_end_by_kind": {kind: summarize(values) for kind, values in sorted(end_to_end.items())},
+        "llm_calls": LLM_PROFILE.calls,
+        "llm_prompt_tokens": LLM_PROFILE.prompt_tokens,
+        "llm_completion_tokens": LLM_PROFILE.completion_tokens,
+        "llm_rate_limited": LLM_PROFILE.rate_limited,
+        "llm_governor": bot.llm_governor.stats(),
+        "llm_wait_by_priority": histogram_means(bot, "llm_governor_wait_seconds", "priority"),
+        "crew_task_times": histogram_means(bot, "crew_task_seconds", "task"),
+        "research_aspect_times": histogram_means(bot, "research_aspect_seconds", "aspect"),
+        "twilio_sends": len(sink.sent),
+        "peak_threads": peak_threads[0],
+        # ru_maxrss é em KB no Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "jobs": bot.crew_job_queue.stats(),
+        "cache": bot.crew_result_cache.stats(),
+        "delivery": bot.twilio_delivery.stats(),
+        "dedup": bot.message_deduplicator.stats(),
+        "debounce": bot.sender_debouncer.stats(),
+    }
+
+
+def histogram_means(bot, name: str, label: str) -> dict:
+    """
+    Média e contagem, por valor de `label`, de um histograma exposto em /metrics.
+    """
+    totals = {}
+    prefix = bot.METRICS_PREFIX + name + "_"
+    for line in bot.metrics.render().splitlines():
+        if not line.startswith(prefix):
+            continue
+        series, _, value = line.rpartition(" ")
+        kind = series[len(prefix):].split("{")[0]
+        if kind in ("sum", "count") and f'{label}="' in series:
+            key = series.split(f'{label}="')[1].split('"')[0]
+            totals.setdefault(key, {})[kind] = float(value)
+    return {
+        key: {"count": int(t.get("count", 0)), "avg_ms": round(1000 * t.get("sum", 0.0) / t["count"], 2) if t.get("count") else 0.0}
+        for key, t in sorted(totals.items())
+    }
+
+
+def print_report(report: dict):
+    print(f"\nRequisições: {report['requests']}  erros: {report['errors']}  drenado: {report['drained']}")
+    print(f"Janela de envio: {report['send_window_s']}s  tempo total: {report['total_time_s']}s")
+    print(f"Vazão do webhook: {report['throughput_rps']} req/s  Crews concluídas: {report['crews_completed_per_s']}/s")
+    w = report["webhook"]
+    print(f"Webhook   p50={w['p50_ms']}ms p95={w['p95_ms']}ms p99={w['p99_ms']}ms max={w['max_ms']}ms")
+    for kind, s in report["webhook_by_kind"].items():
+        print(f"  {kind:<9} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms (n={s['count']})")
+    e = report["end_to_end_crew"]
+    print(f"Crew e2e  p50={e['p50_ms']}ms p95={e['p95_ms']}ms p99={e['p99_ms']}ms (n={e['count']})")
+    print(f"Chamadas LLM: {report['llm_calls']}  tokens de prompt: {report['llm_prompt_tokens']}  tokens de saída: {report['llm_completion_tokens']}  envios Twilio: {report['twilio_sends']}")
+    print(f"Governador LLM: {report['llm_governor']}  429 falsos: {report['llm_rate_limited']}")
+    for priority, s in report["llm_wait_by_priority"].items():
+        print(f"  espera {priority:<11} média={s['avg_ms']}ms (n={s['count']})")
+    for task, s in report["crew_task_times"].items():
+        print(f"  etapa {task:<33} média={s['avg_ms']}ms (n={s['count']})")
+    for aspect, s in report["research_aspect_times"].items():
+        print(f"    aspecto {aspect:<29} média={s['avg_ms']}ms (n={s['count']})")
+    print(f"Pico de threads: {report['peak_threads']}  pico de RSS: {report['peak_rss_mb']} MB")
+    print(f"Fila de jobs: {report['jobs']}")
+    print(f"Cache: {report['cache']}")
+    print(f"Reenvios respondidos de novo: {report['dedup']['duplicates']}  mensagens juntadas: {report['debounce']['joined']}  jobs complementados: {report['jobs']['amended']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do webhook /whatsapp com Gemini e Twilio falsos.")
+    parser.add_argument("--rate", type=float, default=10.0, help="requisições por segundo (tráfego sintético)")
+    parser.add_argument("--requests", type=int, default=200, help="número de requisições sintéticas")
+    parser.add_argument("--mix", default="greeting=0.35,support=0.25,idea=0.15,crew=0.25", help="proporção de cada tipo de mensagem")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="fração de demandas longas repetidas (exercita o cache)")
+    parser.add_argument("--split-ratio", type=float, default=0.0, help="fração de demandas longas enviadas em 2-3 mensagens seguidas")
+    parser.add_argument("--redelivery-ratio", type=float, default=0.0, help="fração de requisições reenviadas com o mesmo MessageSid")
+    parser.add_argument("--replay", help="arquivo JSONL com tráfego gravado, no lugar do sintético")
+    parser.add_argument("--concurrency", type=int, default=32, help="clientes HTTP simultâneos")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="latência mediana do LLM falso")
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.4, help="sigma da latência log-normal")
+    parser.add_argument("--llm-tokens-mean", type=float, default=400.0)
+    parser.add_argument("--llm-tokens-std", type=float, default=120.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="acrescenta tokens/velocidade à latência (0 desliga)")
+    parser.add_argument("--llm-rate-limit-ratio", type=float, default=0.0, help="fração das chamadas ao LLM falso que falham com 429")
+    parser.add_argument("--twilio-latency-ms", type=float, default=50.0, help="latência de cada envio no sink da Twilio")
+    parser.add_argument("--drain-timeout", type=float, default=600.0, help="tempo máximo esperando os jobs terminarem")
+    parser.add_argument("--env", action="append", default=[], help="variável de configuração do bot, ex.: --env CREW_WORKERS=4")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--router", action="store_true", help="roda apenas o micro-benchmark do roteador de intenções")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    parser.add_argument("--verbose", action="store_true", help="mantém os logs DEBUG do bot")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    # O motor de envio não deve ser o gargalo do benchmark, a menos que configurado
+    os.environ.setdefault("TWILIO_MESSAGES_PER_SECOND", "1000")
+    os.environ.setdefault("TWILIO_RATE_BURST", "1000")
+    # Nem a cota do Gemini (o LLM é falso, e os 429 falsos são repetidos rápido); o limite de
+    # concorrência continua valendo
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_RETRY_BASE_SECONDS", "0.05")
+    # O google.colab falso desligaria a validação da assinatura; o benchmark assina as requisições
+    os.environ.setdefault("TWILIO_VALIDATE_SIGNATURE", "1")
+
+    LLM_PROFILE.latency_ms = args.llm_latency_ms
+    LLM_PROFILE.latency_sigma = args.llm_latency_sigma
+    LLM_PROFILE.tokens_mean = args.llm_tokens_mean
+    LLM_PROFILE.tokens_std = args.llm_tokens_std
+    LLM_PROFILE.tokens_per_second = args.llm_tokens_per_second
+    LLM_PROFILE.rate_limit_ratio = args.llm_rate_limit_ratio
+
+    sink = FakeTwilioSink(latency_ms=args.twilio_latency_ms)
+    bot = load_bot(sink, quiet=not args.verbose)
+
+    if args.router:
+        bot.benchmark_intent_router()
+        return
+
+    if args.replay:
+        traffic = replay_traffic(args.replay, args.rate)
+    else:
+        mix = {k: float(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+        traffic = synthetic_traffic(args.requests, args.rate, mix, args.duplicate_ratio, args.split_ratio, args.redelivery_ratio)
+
+    with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+        report = run_load_test(bot, sink, traffic, args.concurrency, args.drain_timeout)
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()